@@ -0,0 +1,271 @@
+"""ASGI server that plays a whole turn per request.
+
+POST /api/turn plays the human's ask and then every AI turn that follows
+until a human's turn comes, and answers with what changed instead of both
+full hands. Clients can also follow a game at GET /api/events?game_id=... as
+Server-Sent Events, which pushes every move as soon as it has been played.
+
+    uvicorn asgi:app
+"""
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+from backend import ai_chooser, games, record_request, table_options
+from metrics import metrics
+from movelog import MoveConflict
+
+NOT_FOUND = {'error': 'No active game. Please start a new game.', 'game_over': True}
+CONFLICT = {'error': 'The game was changed by another request. Please try again.'}
+KEEPALIVE = 15  # Seconds between comments on a quiet event stream
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-headers', b'content-type'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+]
+
+# Event queues of the clients following each game
+subscribers = {}
+
+
+def play_turn(game, value, publish=None, to_player=None):
+    """Play the human's ask and every AI turn until a human's turn comes.
+
+    The human is the current player and asks ``to_player``, by default the
+    next seat. Each move is passed to ``publish`` as soon as it is played.
+    Returns the moves together with the change to the human's hand and the
+    new state.
+    """
+    human = game.current_player
+    if to_player is None:
+        to_player = game._next_player(human)
+    before = Counter(str(card) for card in game.players[human])
+    moves = []
+
+    def record(move):
+        moves.append(move)
+        if publish is not None:
+            publish(move)
+
+    if game.players[human]:
+        success, cards, sets = game.take_turn(human, to_player, value)
+        record({'player': human, 'to': to_player, 'value': value, 'success': success,
+                'cards': [str(card) for card in cards], 'sets': sets})
+    else:
+        # Like the AI, a player without cards draws one, or passes once the deck is empty
+        game.draw_or_pass(human)
+        record({'player': human, 'to': None, 'value': None, 'success': False, 'cards': [], 'sets': []})
+
+    while game.current_player in game.ai_memories and not game.is_game_over():
+        ai = game.current_player
+        game.set_ai_player(ai)
+        asked = bool(game.players[ai])
+        success, cards, sets = game.ai_make_move(ai_chooser)
+        record({
+            'player': ai,
+            'to': game.ai_memory['last_target'] if asked else None,
+            'value': game.ai_memory['last_asked_value'] if asked else None,
+            'success': success,
+            # Cards the AI drew stay hidden
+            'cards': [str(card) for card in cards] if success else [],
+            'sets': sets,
+        })
+
+    after = Counter(str(card) for card in game.players[human])
+    return {
+        'moves': moves,
+        'hand_added': list((after - before).elements()),
+        'hand_removed': list((before - after).elements()),
+        'hand_sizes': [len(hand) for hand in game.players],
+        'deck_size': len(game.deck),
+        'books': game.books,
+        'current_player': game.current_player,
+        'game_over': game.is_game_over(),
+        'winner': game.get_winner(),
+    }
+
+
+def locked_turn(game_id, value, publish, to_player=None):
+    try:
+        with games.checkout(game_id) as game:
+            if game is None:
+                return 400, NOT_FOUND
+            if game.current_player in game.ai_memories:
+                return 400, {'error': 'Not your turn', 'current_player': game.current_player}
+            if to_player is not None and (to_player not in range(len(game.players))
+                                          or to_player == game.current_player):
+                return 400, {'error': 'Ask another player at the table',
+                             'current_player': game.current_player}
+            # A player without cards draws instead, so only an ask needs a value
+            if game.players[game.current_player]:
+                if value not in game.values:
+                    return 400, {'error': 'Ask for a card value', 'current_player': game.current_player}
+                # The AI's bounds on a person's hand rely on people asking for values they hold
+                if not game.value_counts[game.current_player][value]:
+                    return 400, {'error': 'Ask for a value in your hand',
+                                 'current_player': game.current_player}
+            return 200, play_turn(game, value, publish, to_player)
+    except MoveConflict:
+        return 409, CONFLICT
+
+
+def broadcast(game_id, event, payload):
+    for queue in subscribers.get(game_id, ()):
+        queue.put_nowait((event, payload))
+
+
+async def read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(body) if body else {}
+    except ValueError:
+        return {}
+
+
+async def send_json(send, payload, status=200):
+    await send_body(send, json.dumps(payload).encode(), status)
+
+
+async def send_body(send, body, status=200):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')] + CORS_HEADERS,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def new_game(scope, receive, send):
+    data = await read_json(receive)
+    try:
+        game_id, game = games.create(**table_options(data))
+    except (TypeError, ValueError) as error:
+        await send_json(send, {'error': f'Invalid table: {error}'}, 400)
+        return
+    body = json.dumps({
+        'game_id': game_id,
+        'hand_sizes': [len(hand) for hand in game.players],
+        'deck_size': len(game.deck),
+        'current_player': game.current_player,
+        'books': game.books,
+    })
+    # The hands' JSON is cached on the game
+    await send_body(send, f'{body[:-1]}, "hands": {game.human_hands_json()}, '
+                          f'"player1_hand": {game.hand_json(0)}}}'.encode())
+
+
+async def turn(scope, receive, send):
+    data = await read_json(receive)
+    if not isinstance(data, dict):
+        data = {}
+    game_id = data.get('game_id')
+    loop = asyncio.get_running_loop()
+
+    def publish(move):
+        loop.call_soon_threadsafe(broadcast, game_id, 'move', move)
+
+    # AI turns can take a while, so play them off the event loop
+    status, payload = await loop.run_in_executor(
+        None, locked_turn, game_id, data.get('value'), publish, data.get('to_player'))
+    if status == 200:
+        broadcast(game_id, 'turn', payload)
+    await send_json(send, payload, status)
+
+
+async def events(scope, receive, send):
+    game_id = parse_qs(scope['query_string'].decode()).get('game_id', [None])[0]
+    if game_id not in games:
+        await send_json(send, NOT_FOUND, 400)
+        return
+
+    queue = asyncio.Queue()
+    subscribers.setdefault(game_id, set()).add(queue)
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')]
+            + CORS_HEADERS,
+        })
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, timeout=KEEPALIVE,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_event in done:
+                event, payload = next_event.result()
+                chunk = f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            else:
+                next_event.cancel()
+                chunk = ": keepalive\n\n"
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+    finally:
+        disconnected.cancel()
+        queues = subscribers.get(game_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del subscribers[game_id]
+
+
+async def prometheus_metrics(scope, receive, send):
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/plain; version=0.0.4')],
+    })
+    await send({'type': 'http.response.body', 'body': metrics.render().encode()})
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+ROUTES = {
+    ('POST', '/api/new-game'): new_game,
+    ('POST', '/api/turn'): turn,
+    ('GET', '/api/events'): events,
+    ('GET', '/metrics'): prometheus_metrics,
+}
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    if scope['method'] == 'OPTIONS':
+        await send({'type': 'http.response.start', 'status': 204, 'headers': CORS_HEADERS})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    handler = ROUTES.get((scope['method'], scope['path']))
+    route = scope['path'] if handler is not None else 'other'
+    started = time.perf_counter()
+
+    async def timed_send(message):
+        # Latency runs until the response starts, which also suits event streams
+        if message['type'] == 'http.response.start':
+            record_request(scope['method'], route, message['status'], time.perf_counter() - started)
+        await send(message)
+
+    if handler is None:
+        await send_json(timed_send, {'error': 'Not found'}, 404)
+        return
+    await handler(scope, receive, timed_send)
@@ -0,0 +1,98 @@
+"""Game engine, AI and game store shared by the Flask app and the ASGI server.
+
+Everything is configured through environment variables.
+"""
+import atexit
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+
+from decision_cache import install_decision_cache
+from engines import ENGINES
+from metrics import instrument_game, metrics, route_timer
+from montecarlo import MonteCarloAI
+from movelog import MoveLog
+from policy import MicroBatcher, install_policy, load_policy
+from profiler import SamplingProfiler
+from registry import GameRegistry
+
+# Game engine, picked with the GOFISH_ENGINE environment variable
+ENGINE = ENGINES[os.environ.get('GOFISH_ENGINE', 'classic')]
+
+# Timers on the engine's hot paths, served with the rest of the metrics at
+# /metrics; GOFISH_METRICS=0 leaves the engine untouched
+if os.environ.get('GOFISH_METRICS', '1') != '0':
+    instrument_game(ENGINE)
+record_request = route_timer()
+
+# Optional cache of AI decisions, warmed from and saved back to a file
+DECISION_CACHE_SIZE = int(os.environ.get('GOFISH_DECISION_CACHE_SIZE', 0))
+DECISION_CACHE_FILE = os.environ.get('GOFISH_DECISION_CACHE_FILE')
+if DECISION_CACHE_SIZE:
+    decision_cache = install_decision_cache(DECISION_CACHE_SIZE, DECISION_CACHE_FILE)
+    if DECISION_CACHE_FILE:
+        atexit.register(decision_cache.save, DECISION_CACHE_FILE)
+
+# AI used for the AI's turns: 'heuristic' or 'montecarlo' rollouts within a
+# per-move time budget, optionally helped by a pool of worker processes
+AI_MODE = os.environ.get('GOFISH_AI', 'heuristic')
+AI_BUDGET_MS = int(os.environ.get('GOFISH_AI_BUDGET_MS', 50))
+AI_WORKERS = int(os.environ.get('GOFISH_AI_WORKERS', 0))
+ai_chooser = None  # None keeps GoFishGame's own strategies
+if AI_MODE == 'montecarlo':
+    ai_chooser = MonteCarloAI(
+        budget=AI_BUDGET_MS / 1000,
+        executor=ProcessPoolExecutor(AI_WORKERS) if AI_WORKERS else None,
+        parallel=AI_WORKERS,
+    )
+
+# Optional policy asked before the heuristics: a lookup table (.npy) or a
+# small network (.npz) from policy.py. Requests arriving within
+# GOFISH_POLICY_BATCH_MS of each other are scored together; 0 scores each alone.
+POLICY_PATH = os.environ.get('GOFISH_POLICY')
+POLICY_BATCH_MS = float(os.environ.get('GOFISH_POLICY_BATCH_MS', 2))
+if POLICY_PATH:
+    policy = load_policy(POLICY_PATH)
+    if POLICY_BATCH_MS:
+        policy = MicroBatcher(policy, window=POLICY_BATCH_MS / 1000)
+    install_policy(policy)
+
+# Active games, keyed by the game ID handed out by /api/new-game
+MAX_GAMES = 10000
+GAME_TTL = 60 * 60  # Seconds a game may sit idle before it is dropped
+# Optional SQLite move log; servers sharing the file share their games
+STORE_PATH = os.environ.get('GOFISH_STORE')
+store = MoveLog(STORE_PATH) if STORE_PATH else None
+games = GameRegistry(ENGINE, max_games=MAX_GAMES, ttl=GAME_TTL, store=store)
+metrics.gauge('gofish_active_games', 'Games held in memory by this process', lambda: len(games))
+
+
+def table_options(data):
+    """Keyword arguments for games.create() from a /api/new-game body.
+
+    The table is optional: number of seats, decks in the shoe and the seats
+    the AI plays. Raises TypeError when the body is not a JSON object.
+    """
+    if not isinstance(data, dict):
+        raise TypeError('the table must be a JSON object')
+    return {key: data[key] for key in ('seats', 'decks', 'ai_seats') if key in data}
+
+# Sampling profiler, off unless GOFISH_PROFILE names a file for its stacks.
+# SIGUSR1 starts it, and the next SIGUSR1 stops it and writes the stacks
+# ({pid} in the name is replaced by the process ID)
+PROFILE_PATH = os.environ.get('GOFISH_PROFILE')
+profiler = SamplingProfiler()
+
+
+def toggle_profiler(*args):
+    if profiler.running:
+        profiler.stop()
+        profiler.dump(PROFILE_PATH.format(pid=os.getpid()))
+        profiler.clear()
+    else:
+        profiler.start()
+
+
+if PROFILE_PATH and hasattr(signal, 'SIGUSR1'):
+    signal.signal(signal.SIGUSR1, toggle_profiler)
+    atexit.register(lambda: profiler.running and toggle_profiler())
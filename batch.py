@@ -0,0 +1,229 @@
+"""Lockstep NumPy engine that plays many games at once.
+
+K games are held as arrays (a K x 2 x 13 tensor of rank counts for the hands,
+K x 52 decks with cursors and K x 2 books) and every call to ``step`` plays
+one turn of each unfinished game, following the same rules as
+``GoFishGame.ai_make_move``. Only strategies that can be vectorized are
+available: ``greedy`` matches ``simulate.greedy_strategy`` exactly, while
+``random`` draws from a NumPy generator and so does not reproduce the
+per-game Python RNG.
+
+Run through ``simulate.py --vectorized``. Running this module checks greedy
+self-play against the per-game engine, game by game:
+
+    python batch.py --games 2000
+"""
+import argparse
+import random
+import sys
+from collections import Counter
+
+import numpy as np
+
+from engines import ENGINES
+from simulate import MAX_TURNS, STRATEGIES, SimulationStats, game_seed, play_game
+
+BATCH_STRATEGIES = ('greedy', 'random')
+
+
+def shuffled_deck(rng):
+    """Card numbers of a shuffled deck, top card last.
+
+    Uses the order of CompactGoFishGame.initialize_deck, so the same rng
+    gives the same deck.
+    """
+    deck = [rank << 2 | suit for suit in range(4) for rank in range(13)]
+    rng.shuffle(deck)
+    return deck
+
+
+class BatchGoFish:
+    """Many two-player games stepped together"""
+
+    def __init__(self, decks):
+        self.decks = np.asarray(decks, dtype=np.int8)
+        size = len(self.decks)
+        self.cursors = np.full(size, self.decks.shape[1], dtype=np.int16)  # Cards left in each deck
+        self.counts = np.zeros((size, 2, 13), dtype=np.int8)  # Cards of each rank per hand
+        self.books = np.zeros((size, 2), dtype=np.int8)
+        self.current = np.zeros(size, dtype=np.int8)
+        self.turns = np.zeros(size, dtype=np.int32)
+        self.finished = np.zeros(size, dtype=bool)
+        self.deal_cards()
+
+    @classmethod
+    def from_seeds(cls, seed, start, stop):
+        """Games ``start`` to ``stop`` of a simulate.py run with this seed"""
+        return cls([shuffled_deck(random.Random(game_seed(seed, index))) for index in range(start, stop)])
+
+    @classmethod
+    def from_positions(cls, decks, cursors, counts, books, current):
+        """Games already in progress; each deck's remaining cards lie below its cursor"""
+        batch = cls.__new__(cls)
+        batch.decks = np.asarray(decks, dtype=np.int8)
+        batch.cursors = np.asarray(cursors, dtype=np.int16)
+        batch.counts = np.asarray(counts, dtype=np.int8)
+        batch.books = np.asarray(books, dtype=np.int8)
+        batch.current = np.asarray(current, dtype=np.int8)
+        batch.turns = np.zeros(len(batch.decks), dtype=np.int32)
+        batch.finished = batch.game_over()
+        return batch
+
+    def __len__(self):
+        return len(self.decks)
+
+    def deal_cards(self):
+        # Deal 5 cards to each player, alternating like GoFishGame.deal_cards
+        games = np.arange(len(self))
+        for _ in range(5):
+            for seat in (0, 1):
+                self._draw(games, np.full(len(games), seat, dtype=np.int8))
+
+    def _draw(self, games, seats):
+        """Move the top card of each game's deck into the seat's hand"""
+        has_cards = self.cursors[games] > 0
+        games, seats = games[has_cards], seats[has_cards]
+        self.cursors[games] -= 1
+        ranks = self.decks[games, self.cursors[games]] >> 2
+        self.counts[games, seats, ranks] += 1
+
+    def game_over(self):
+        hand_sizes = self.counts.sum(axis=2)
+        deck_empty = self.cursors == 0
+        return (deck_empty & (hand_sizes == 0).any(axis=1)) | (self.books.sum(axis=1) == 13)
+
+    def winners(self):
+        """Winner of every game as GoFishGame.get_winner sees it, -1 for a tie"""
+        by_books = np.where(self.books[:, 0] > self.books[:, 1], 0,
+                            np.where(self.books[:, 1] > self.books[:, 0], 1, -1))
+        out = self.counts.sum(axis=2) == 0
+        # A player who is out alone wins; otherwise, books decide
+        return np.where(self.books.sum(axis=1) == 13, by_books,
+                        np.where(out[:, 0] & ~out[:, 1], 0,
+                                 np.where(out[:, 1] & ~out[:, 0], 1, by_books)))
+
+    def _choose(self, strategy, hands, rng):
+        """Rank each hand asks for; hands are never empty"""
+        if strategy == 'greedy':
+            # First maximum, i.e. the lowest value on ties
+            return hands.argmax(axis=1)
+        # Random card in hand: pick a rank weighted by how many cards it has
+        cumulative = hands.cumsum(axis=1)
+        picks = (rng.random(len(hands)) * cumulative[:, -1]).astype(np.int16)
+        return (cumulative <= picks[:, None]).sum(axis=1)
+
+    def step(self, strategies, rng=None, ranks=None):
+        """Play one turn of every unfinished game.
+
+        ``ranks`` optionally gives, per game, the rank to ask for this turn
+        instead of the one the strategies would pick.
+        """
+        games = np.flatnonzero(~self.finished)
+        seats = self.current[games]
+        opponents = 1 - seats
+        empty = self.counts[games, seats].sum(axis=1) == 0
+
+        # A player without cards draws one, or passes once the deck is empty
+        stuck = games[empty]
+        passing = stuck[self.cursors[stuck] == 0]
+        self._draw(stuck, seats[empty])
+        self.current[passing] = 1 - self.current[passing]
+
+        games, seats, opponents = games[~empty], seats[~empty], opponents[~empty]
+        if ranks is not None:
+            ranks = ranks[games]
+        else:
+            ranks = np.empty(len(games), dtype=np.intp)
+            for seat, strategy in enumerate(strategies):
+                mine = seats == seat
+                ranks[mine] = self._choose(strategy, self.counts[games[mine], seat], rng)
+
+        taken = self.counts[games, opponents, ranks]
+        success = taken > 0
+        self.counts[games, seats, ranks] += taken
+        self.counts[games, opponents, ranks] = 0
+        # Go fish
+        failed, failed_seats = games[~success], seats[~success]
+        self._draw(failed, failed_seats)
+
+        # Check for sets
+        hands = self.counts[games, seats]
+        full = hands == 4
+        self.books[games, seats] += full.sum(axis=1, dtype=np.int8)
+        hands[full] = 0
+        self.counts[games, seats] = hands
+
+        # A failed ask draws a second card, if any, and passes the turn
+        self._draw(failed, failed_seats)
+        self.current[failed] = 1 - failed_seats
+
+        self.turns[~self.finished] += 1
+        self.finished |= self.game_over()
+
+    def run(self, strategies, rng=None, max_turns=MAX_TURNS):
+        """Step until every game is over or has reached ``max_turns``"""
+        for _ in range(max_turns):
+            if self.finished.all():
+                break
+            self.step(strategies, rng)
+        return self
+
+    def stats(self):
+        stats = SimulationStats()
+        stats.games = len(self)
+        winners = self.winners()[self.finished]
+        stats.wins = [int((winners == 0).sum()), int((winners == 1).sum())]
+        stats.ties = int((winners == -1).sum())
+        stats.abandoned = int((~self.finished).sum())
+        for seat in (0, 1):
+            stats.books[seat] = _counter(self.books[:, seat])
+        stats.lengths = _counter(self.turns)
+        return stats
+
+
+def _counter(values):
+    found, counts = np.unique(values, return_counts=True)
+    return Counter(dict(zip(found.tolist(), counts.tolist())))
+
+
+def run_batch(strategies, seed, start, stop):
+    """Play games ``start`` to ``stop`` of a run and return their SimulationStats"""
+    batch = BatchGoFish.from_seeds(seed, start, stop)
+    rng = np.random.default_rng(game_seed(seed, start))
+    return batch.run(strategies, rng).stats()
+
+
+def compare_with_engine(games, seed=0, engine='compact'):
+    """Play greedy self-play games in both engines; return indices that differ"""
+    batch = BatchGoFish.from_seeds(seed, 0, games).run(('greedy', 'greedy'))
+    winners = batch.winners()
+    strategies = [STRATEGIES['greedy'], STRATEGIES['greedy']]
+    mismatches = []
+    for index in range(games):
+        game, turns, finished = play_game(ENGINES[engine], strategies, random.Random(game_seed(seed, index)))
+        winner = game.get_winner()
+        if (game.books != batch.books[index].tolist() or turns != batch.turns[index]
+                or finished != batch.finished[index]
+                or [len(hand) for hand in game.players] != batch.counts[index].sum(axis=1).tolist()
+                or finished and (-1 if winner is None else winner) != winners[index]):
+            mismatches.append(index)
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check that the batch engine plays the same games as the per-game engine")
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', default='compact', choices=sorted(ENGINES))
+    args = parser.parse_args(argv)
+
+    mismatches = compare_with_engine(args.games, args.seed, args.engine)
+    if mismatches:
+        print(f"{len(mismatches)} of {args.games} games differ, first: {mismatches[:10]}")
+        sys.exit(1)
+    print(f"{args.games} games identical")
+
+
+if __name__ == '__main__':
+    main()
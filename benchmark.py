@@ -0,0 +1,213 @@
+"""Benchmarks of the engine, AI and HTTP hot paths.
+
+Every benchmark times one operation many times on freshly set up games and
+reports calls per second, p50/p99 latency and the memory a call allocates.
+Results can be saved as a JSON baseline, and a later run compared against it
+fails when a benchmark got slower than the allowed threshold:
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.15
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from engines import ENGINES
+
+CALLS = 1000  # Timed calls per benchmark
+WARMUP = 100  # Untimed calls before the timed ones
+ALLOC_CALLS = 100  # Calls traced for allocations, which is slow
+REPEAT = 3  # Runs per benchmark; the one with the lowest p50 is kept
+THRESHOLD = 0.20  # Allowed slowdown of p50 latency against a baseline
+MIDGAME_TURNS = 6  # AI turns played before the operation in mid-game setups
+
+
+def midgame(engine, seed):
+    """A seeded game a few turns in, with both seats remembering moves"""
+    rng = random.Random(seed)
+    game = engine(rng=rng)
+    game.set_ai_player(0)
+    game.set_ai_player(1)
+    for _ in range(rng.randrange(MIDGAME_TURNS)):
+        if game.is_game_over():
+            break
+        game.set_ai_player(game.current_player)
+        game.ai_make_move()
+    return game
+
+
+def held_value(game, player):
+    """Value of a card in a player's hand, or None for an empty hand"""
+    for card in game.players[player]:
+        return card.value
+    return None
+
+
+# Each benchmark is a pair of functions: setup(seed) builds the input of one
+# call outside the timer, and run(state) is the timed operation.
+
+def engine_benchmarks(engine):
+    def ask_setup(seed):
+        game = midgame(engine, seed)
+        player = game.current_player
+        return game, player, held_value(game, player) or 'A'
+
+    def ai_setup(seed):
+        game = midgame(engine, seed)
+        game.set_ai_player(game.current_player)
+        return game
+
+    return {
+        'new_game': (lambda seed: seed, lambda seed: engine(rng=random.Random(seed))),
+        'ask_for_cards': (ask_setup, lambda state: state[0].ask_for_cards(state[1], 1 - state[1], state[2])),
+        'check_for_sets': (lambda seed: midgame(engine, seed), lambda game: game.check_for_sets(game.current_player)),
+        'ai_make_move': (ai_setup, lambda game: game.ai_make_move()),
+    }
+
+
+def api_benchmarks():
+    from app import app
+    from backend import games
+    client = app.test_client()
+
+    def ask_setup(seed):
+        game_id, game = games.create()
+        game.current_player = 0
+        return {'game_id': game_id, 'from_player': 0, 'to_player': 1, 'value': held_value(game, 0)}
+
+    def ai_setup(seed):
+        game_id, game = games.create()
+        game.current_player = 1
+        return {'game_id': game_id}
+
+    def post(path):
+        def run(body=None):
+            response = client.post(path, json=body)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        return run
+
+    return {
+        'api_new_game': (lambda seed: None, post('/api/new-game')),
+        'api_ask_cards': (ask_setup, post('/api/ask-cards')),
+        'api_ai_move': (ai_setup, post('/api/ai-move')),
+    }
+
+
+def percentile(sorted_times, fraction):
+    return sorted_times[min(len(sorted_times) - 1, int(len(sorted_times) * fraction))]
+
+
+def measure(setup, run, calls=CALLS, warmup=WARMUP, alloc_calls=ALLOC_CALLS):
+    """Time ``calls`` calls of ``run``, each on a fresh ``setup(seed)``"""
+    for seed in range(warmup):
+        run(setup(seed))
+
+    times = []
+    for seed in range(warmup, warmup + calls):
+        state = setup(seed)
+        started = time.perf_counter_ns()
+        run(state)
+        times.append(time.perf_counter_ns() - started)
+    times.sort()
+
+    # Peak memory allocated while a call runs, traced separately as tracing
+    # slows everything down
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for seed in range(warmup + calls, warmup + calls + alloc_calls):
+            state = setup(seed)
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            run(state)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls': calls,
+        'ops_per_sec': calls / (sum(times) / 1e9),
+        'p50_us': percentile(times, 0.50) / 1000,
+        'p99_us': percentile(times, 0.99) / 1000,
+        'alloc_bytes': allocated / alloc_calls if alloc_calls else 0,
+    }
+
+
+def collect(engines, api=True):
+    for name in engines:
+        for op, bench in engine_benchmarks(ENGINES[name]).items():
+            yield f'{name}.{op}', bench
+    # Importing the server instruments its engine, so measure the bare
+    # engines first
+    if api:
+        yield from api_benchmarks().items()
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Return the benchmarks whose p50 latency grew by more than ``threshold``"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is not None and result['p50_us'] > base['p50_us'] * (1 + threshold):
+            regressions.append(name)
+    return regressions
+
+
+def format_report(results, baseline=None):
+    lines = [f"{'benchmark':28s} {'ops/sec':>10s} {'p50 us':>9s} {'p99 us':>9s} {'alloc B':>9s}"]
+    for name, result in results.items():
+        line = (f"{name:28s} {result['ops_per_sec']:10,.0f} {result['p50_us']:9.1f} "
+                f"{result['p99_us']:9.1f} {result['alloc_bytes']:9,.0f}")
+        if baseline and name in baseline:
+            change = result['p50_us'] / baseline[name]['p50_us'] - 1
+            line += f"  p50 {change:+.1%}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engines', nargs='+', default=sorted(ENGINES), choices=sorted(ENGINES))
+    parser.add_argument('--no-api', action='store_true', help="skip the Flask benchmarks")
+    parser.add_argument('--filter', default='', help="only run benchmarks whose name contains this")
+    parser.add_argument('--calls', type=int, default=CALLS)
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help="runs per benchmark, keeping the fastest to filter out noise")
+    parser.add_argument('--save', metavar='PATH', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="fail on regressions against a JSON baseline")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f"allowed p50 slowdown against the baseline (default {THRESHOLD})")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, (setup, run) in collect(args.engines, not args.no_api):
+        if args.filter in name:
+            runs = [measure(setup, run, args.calls) for _ in range(args.repeat)]
+            results[name] = min(runs, key=lambda result: result['p50_us'])
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_report(results, baseline))
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Slower than the baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
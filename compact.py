@@ -0,0 +1,185 @@
+from game import CARD_LABELS, SUITS, VALUES, GoFishGame
+
+RANK_INDEX = {value: index for index, value in enumerate(VALUES)}
+
+# Cards are numbered rank-major (card = rank * 4 + suit), so in a 52-bit hand
+# mask every rank owns one 4-bit nibble and the bits come out sorted by rank.
+LABELS = tuple(CARD_LABELS[suit, value] for value in VALUES for suit in SUITS)
+NIBBLE_COUNT = tuple(bin(nibble).count('1') for nibble in range(16))
+NIBBLE_SUITS = tuple(
+    tuple(suit for suit in range(4) if nibble >> suit & 1) for nibble in range(16)
+)
+FULL_RANKS = int('0001' * 13, 2)  # Lowest bit of every rank nibble
+SHIFTS = tuple(rank << 2 for rank in range(13))
+
+
+class CompactCard(int):
+    """Card stored as its number; str() gives the same label as Card"""
+    __slots__ = ()
+
+    def __str__(self):
+        return LABELS[self]
+
+    @property
+    def value(self):
+        return VALUES[self >> 2]
+
+    @property
+    def suit(self):
+        return SUITS[self & 3]
+
+    @property
+    def rank(self):
+        return (self >> 2) + 2
+
+
+# The 52 cards are shared by every game
+CARDS = tuple(CompactCard(number) for number in range(52))
+# Same order as the deck of GoFishGame, so a seeded game deals the same cards
+DECK = tuple(CARDS[rank << 2 | suit] for suit in range(4) for rank in range(13))
+
+
+class CompactHand:
+    """Hand kept as a 52-bit mask, iterated in rank order"""
+    __slots__ = ('mask', 'size')
+
+    def __init__(self):
+        self.mask = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            yield CARDS[low.bit_length() - 1]
+            mask ^= low
+
+    def append(self, card):
+        self.mask |= 1 << card
+        self.size += 1
+
+    def sort(self):
+        # Cards are always in rank order
+        pass
+
+    def count(self, rank):
+        return NIBBLE_COUNT[self.mask >> (rank << 2) & 15]
+
+    def take(self, rank):
+        """Remove every card of a rank and return them"""
+        shift = rank << 2
+        nibble = self.mask >> shift & 15
+        if not nibble:
+            return []
+        self.mask &= ~(15 << shift)
+        self.size -= NIBBLE_COUNT[nibble]
+        return [CARDS[shift + suit] for suit in NIBBLE_SUITS[nibble]]
+
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+
+
+class RankCounts:
+    """Cards of each value in a CompactHand, read from its mask.
+
+    Stands in for the per-hand dicts of GoFishGame.value_counts, so a hand's
+    counts are not kept a second time.
+    """
+    __slots__ = ('hand',)
+
+    def __init__(self, hand):
+        self.hand = hand
+
+    def __getitem__(self, value):
+        return self.hand.count(RANK_INDEX[value])
+
+    def get(self, value, default=None):
+        rank = RANK_INDEX.get(value)
+        return default if rank is None else self.hand.count(rank)
+
+    def __contains__(self, value):
+        return value in RANK_INDEX
+
+    def __iter__(self):
+        return iter(VALUES)
+
+    def __len__(self):
+        return len(VALUES)
+
+    def keys(self):
+        return VALUES
+
+    def values(self):
+        mask = self.hand.mask
+        return [NIBBLE_COUNT[mask >> shift & 15] for shift in SHIFTS]
+
+    def items(self):
+        return zip(VALUES, self.values())
+
+
+class CompactGoFishGame(GoFishGame):
+    """GoFishGame storing cards as small ints and hands as bitmasks.
+
+    Transfers and set checks work on one 4-bit nibble per rank instead of
+    scanning Card objects, and no per-card objects are allocated.
+    """
+    hand_class = CompactHand
+
+    def __init__(self, rng=None, seats=2, decks=1, ai_seats=None):
+        # A hand mask has one bit per card, so it cannot hold duplicates
+        if decks != 1:
+            raise ValueError("The compact engine plays with a single deck")
+        super().__init__(rng, seats, decks, ai_seats)
+
+    def initialize_deck(self):
+        self.deck = self.deck_class(DECK, self.rng)
+
+    def _card_id(self, card):
+        # Cards are already numbered as in snapshots
+        return int(card)
+
+    def _card(self, number):
+        return CARDS[number]
+
+    def _new_counts(self, hand):
+        return RankCounts(hand)
+
+    def _count_change(self, player_index, value, delta):
+        # The counts are read from the hand's mask, which is already up to date
+        self.hand_versions[player_index] += 1
+
+    def check_for_sets(self, player_index):
+        hand = self.players[player_index]
+        mask = hand.mask
+        full = mask & mask >> 1 & mask >> 2 & mask >> 3 & FULL_RANKS
+        sets = []
+        while full:
+            low = full & -full
+            shift = low.bit_length() - 1
+            sets.append(VALUES[shift >> 2])
+            # Remove the set from player's hand
+            hand.mask &= ~(15 << shift)
+            hand.size -= 4
+            self._book(player_index, VALUES[shift >> 2])
+            full ^= low
+        return sets
+
+    def ask_for_cards(self, from_player, to_player, value):
+        rank = RANK_INDEX.get(value)
+        matching_cards = self.players[to_player].take(rank) if rank is not None else []
+
+        if matching_cards:
+            self.players[from_player].extend(matching_cards)
+            self._count_change(from_player, value, len(matching_cards))
+            self._count_change(to_player, value, -len(matching_cards))
+            self._remember_ask(from_player, to_player, value, len(matching_cards))
+            return True, matching_cards
+        else:
+            # Go fish
+            self._draw(from_player)
+            self._remember_ask(from_player, to_player, value, 0)
+            return False, []
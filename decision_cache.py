@@ -0,0 +1,87 @@
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+from game import GoFishGame
+
+
+class DecisionCache:
+    """LRU cache of AI decisions keyed by the game state they were made in.
+
+    Keys come from ``GoFishGame._decision_key``, a hash of every input that
+    ``_compute_best_card_to_ask`` reads, so a hit returns the value the AI
+    would have computed. The cache can be saved to disk and loaded back
+    to start warm.
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path):
+        """Write the entries to ``path``, least recently used first"""
+        with self._lock:
+            entries = list(self._entries.items())
+        # Write to a temporary file first so a crash never leaves a torn cache
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as file:
+            pickle.dump(entries, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(file.name, path)
+
+    def load(self, path):
+        """Add the entries saved in ``path``; a missing file is ignored"""
+        try:
+            with open(path, 'rb') as file:
+                entries = pickle.load(file)
+        except FileNotFoundError:
+            return 0
+        for key, value in entries:
+            self.put(key, value)
+        return len(entries)
+
+
+def install_decision_cache(max_size, path=None):
+    """Share a new DecisionCache between all games, warmed from ``path`` if given"""
+    cache = DecisionCache(max_size)
+    if path:
+        cache.load(path)
+    GoFishGame.decision_cache = cache
+    return cache
@@ -0,0 +1,56 @@
+"""Decks that deal their cards in a random order from a seeded rng.
+
+``random.shuffle`` walks the list from the end, swapping each position with
+a random one before it, and then never touches that position again. So
+shuffling a deck and popping cards off the end draws exactly what picking
+each card only when it is drawn would, with the same calls on the rng.
+LazyDeck does the latter and only pays for the cards a game actually draws.
+"""
+
+
+class ShuffledDeck(list):
+    """Deck shuffled in full up front; the top card is the last one.
+
+    Without an rng the cards stay in the order given, as when restoring a deck.
+    """
+
+    def __init__(self, cards, rng):
+        super().__init__(cards)
+        if rng is not None:
+            rng.shuffle(self)
+
+    def draw(self, rng):
+        return self.pop()
+
+
+class LazyDeck:
+    """Deck that picks each card at random when it is drawn.
+
+    The cards still in the deck are the first ``size`` ones of ``cards``;
+    a draw swaps a random one of them into the last of those places and
+    shrinks the deck by one, a single step of a Fisher-Yates shuffle.
+    """
+    __slots__ = ('cards', 'size')
+
+    def __init__(self, cards, rng=None):
+        self.cards = list(cards)
+        self.size = len(self.cards)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        # Cards left, in no particular order
+        return iter(self.cards[:self.size])
+
+    def draw(self, rng):
+        last = self.size - 1
+        if last < 0:
+            raise IndexError('draw from an empty deck')
+        cards = self.cards
+        if last:
+            # randrange(n) is what random.shuffle picks with at the same step
+            pick = rng.randrange(last + 1)
+            cards[pick], cards[last] = cards[last], cards[pick]
+        self.size = last
+        return cards[last]
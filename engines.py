@@ -0,0 +1,8 @@
+from compact import CompactGoFishGame
+from game import GoFishGame
+
+# Game engines by name, for the server and the simulator
+ENGINES = {
+    'classic': GoFishGame,
+    'compact': CompactGoFishGame,  # Cards as ints, hands as bitmasks
+}
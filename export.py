@@ -0,0 +1,259 @@
+"""Export the AI's decisions in self-play as training data.
+
+Every time a seat picks a value to ask for, the export records what the AI
+knew (its counts per rank, the deck and hand sizes, and its memory: the
+odds and bounds on the opponent's cards, its past asks and the opponent's),
+the value it asked for and how the game ended for that seat. Games run on a
+process pool and every worker streams its rows through a generator pipeline
+into fixed-size chunks, which it writes itself as one .npy file per column:
+
+    python export.py --games 1000000 --seats heuristic heuristic --out data
+
+``read_chunks("data")`` then yields each chunk's columns memory-mapped, so
+training code can walk hundreds of millions of rows without loading them.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import time
+
+import numpy as np
+
+from engines import ENGINES
+from game import VALUES
+from simulate import STRATEGIES, game_seed, play_game
+
+CHUNK_ROWS = 65536  # Rows per chunk file
+SHARD_SIZE = 10000  # Games played per pool task
+RANKS = len(VALUES)
+RANK_INDEX = {value: index for index, value in enumerate(VALUES)}
+# How the heuristic AI picked its ask; other strategies record -1
+RULES = ('potential_sets', 'high_probability', 'multiple', 'behavior', 'high_value', 'cache', 'policy')
+RULE_INDEX = {rule: index for index, rule in enumerate(RULES)}
+
+# Column name: (dtype, shape of one row)
+COLUMNS = {
+    'game': ('int64', ()),  # Index of the game in the run
+    'seat': ('int8', ()),
+    'turn': ('int16', ()),  # The seat's own turns so far
+    'counts': ('int8', (RANKS,)),  # Cards of each rank in the seat's hand
+    'deck_size': ('int16', ()),
+    'hand_size': ('int16', ()),
+    'opponent_hand_size': ('int16', ()),
+    'books': ('int8', ()),
+    'opponent_books': ('int8', ()),
+    'probabilities': ('float32', (RANKS,)),  # Chance the opponent holds each rank
+    'opponent_low': ('int8', (RANKS,)),  # Bounds on the opponent's cards of each rank
+    'opponent_high': ('int8', (RANKS,)),
+    'successes': ('int16', (RANKS,)),  # The seat's successful asks per rank
+    'failures': ('int16', (RANKS,)),
+    'asked': ('bool', (RANKS,)),  # Ranks the seat has asked for
+    'opponent_asks': ('int8', (RANKS,)),  # 1 for the opponent's latest ask, 2 the one before, ...
+    'rule': ('int8', ()),
+    'ask': ('int8', ()),  # Rank asked for
+    'outcome': ('int8', ()),  # 1 if the seat won the game, -1 if it lost, 0 otherwise
+}
+# Columns describing what the AI knows before it decides, in the order of decision_state
+STATE_COLUMNS = (
+    'seat', 'turn', 'counts', 'deck_size', 'hand_size', 'opponent_hand_size', 'books',
+    'opponent_books', 'probabilities', 'opponent_low', 'opponent_high', 'successes', 'failures',
+    'asked', 'opponent_asks',
+)
+# Columns of decision_row; the outcome is added once the game is over
+ROW_COLUMNS = ('game',) + STATE_COLUMNS + ('rule', 'ask')
+
+
+def decision_state(game):
+    """What the AI playing ``game`` knows, as the values of STATE_COLUMNS"""
+    seat = game.ai_player
+    opponent = 1 - seat
+    memory = game.ai_memory
+    counts = list(game.value_counts[seat].values())
+    lows, highs = memory['opponents'].ranges(opponent, game._unseen_counts())
+    successes = memory['successful_asks']
+    failures = memory['failed_asks']
+    recent = list(memory['player_asked_for'])
+    opponent_asks = [0] * RANKS
+    for age, asked in enumerate(reversed(recent), 1):
+        opponent_asks[RANK_INDEX[asked]] = min(age, 127)
+    return (
+        seat,
+        memory['turn_count'],
+        counts,
+        len(game.deck),
+        len(game.players[seat]),
+        len(game.players[opponent]),
+        game.books[seat],
+        game.books[opponent],
+        list(memory['card_probabilities'].values()),
+        lows,
+        highs,
+        [successes.get(value, 0) for value in VALUES],
+        [failures.get(value, 0) for value in VALUES],
+        [value in memory['asked_cards'] for value in VALUES],
+        opponent_asks,
+    )
+
+
+def decision_row(game, game_index, ask):
+    """What the AI knew when it chose to ask for ``ask``, as the values of ROW_COLUMNS"""
+    rule = RULE_INDEX.get(game.ai_memory['last_strategy'], -1)
+    return (game_index,) + decision_state(game) + (rule, RANK_INDEX[ask])
+
+
+def recording(strategy, game_index, rows):
+    """Wrap a strategy so every decision it makes is appended to ``rows``"""
+    def choose(game, rng):
+        game.ai_memory['last_strategy'] = None
+        value = strategy(game, rng)
+        rows.append(decision_row(game, game_index, value))
+        return value
+    return choose
+
+
+def decision_points(engine, strategies, seed, start, stop):
+    """Play games ``start`` to ``stop`` and yield each game's decisions as columns"""
+    for index in range(start, stop):
+        rows = []
+        game, turns, finished = play_game(
+            engine, [recording(strategy, index, rows) for strategy in strategies],
+            random.Random(game_seed(seed, index)))
+        if not rows:
+            continue
+        winner = game.get_winner() if finished else None
+        columns = {name: np.array(column, dtype=COLUMNS[name][0])
+                   for name, column in zip(ROW_COLUMNS, zip(*rows))}
+        outcome = np.zeros(len(rows), dtype=np.int8)
+        if winner is not None:
+            outcome[:] = np.where(columns['seat'] == winner, 1, -1)
+        columns['outcome'] = outcome
+        yield columns
+
+
+def chunked(batches, chunk_rows=CHUNK_ROWS):
+    """Regroup batches of rows into chunks of ``chunk_rows`` rows; the last may be short.
+
+    Only one chunk is buffered, whatever the number of rows, so a chunk is
+    only valid until the next one is requested.
+    """
+    buffer = {name: np.empty((chunk_rows,) + shape, dtype) for name, (dtype, shape) in COLUMNS.items()}
+    filled = 0
+    for batch in batches:
+        size = len(batch['game'])
+        taken = 0
+        while taken < size:
+            count = min(size - taken, chunk_rows - filled)
+            for name, column in batch.items():
+                buffer[name][filled:filled + count] = column[taken:taken + count]
+            filled += count
+            taken += count
+            if filled == chunk_rows:
+                yield buffer
+                filled = 0
+    if filled:
+        yield {name: column[:filled] for name, column in buffer.items()}
+
+
+def write_chunks(chunks, directory, prefix):
+    """Write every chunk as a directory of .npy files; return the chunks' names and sizes"""
+    written = []
+    for number, chunk in enumerate(chunks):
+        name = f'{prefix}-{number:05d}'
+        # Write under a temporary name so readers never see half a chunk
+        partial = os.path.join(directory, f'.{name}')
+        os.makedirs(partial, exist_ok=True)
+        for column, values in chunk.items():
+            np.save(os.path.join(partial, f'{column}.npy'), values)
+        final = os.path.join(directory, name)
+        if os.path.exists(final):
+            shutil.rmtree(final)
+        os.rename(partial, final)
+        written.append((name, len(chunk['game'])))
+    return written
+
+
+def export_shard(task):
+    """Play one shard of games in a worker and write its chunks there"""
+    engine_name, strategy_names, seed, start, stop, directory, chunk_rows = task
+    strategies = [STRATEGIES[name] for name in strategy_names]
+    batches = decision_points(ENGINES[engine_name], strategies, seed, start, stop)
+    return write_chunks(chunked(batches, chunk_rows), directory, f'chunk-{start:012d}')
+
+
+def export(games, directory, strategies=('heuristic', 'heuristic'), engine='compact', seed=0,
+           processes=None, shard_size=SHARD_SIZE, chunk_rows=CHUNK_ROWS):
+    """Export the decisions of ``games`` self-play games to ``directory``.
+
+    Workers write the chunks themselves and only send back their names, so
+    the rows never pass through this process. A manifest.json listing the
+    columns and chunks is written last. Returns the number of rows.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tasks = [
+        (engine, tuple(strategies), seed, start, min(start + shard_size, games), directory, chunk_rows)
+        for start in range(0, games, shard_size)
+    ]
+    chunks = []
+    if processes == 1:
+        for task in tasks:
+            chunks.extend(export_shard(task))
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            for written in pool.imap_unordered(export_shard, tasks):
+                chunks.extend(written)
+    chunks.sort()
+    manifest = {
+        'columns': {name: {'dtype': dtype, 'shape': list(shape)} for name, (dtype, shape) in COLUMNS.items()},
+        'values': list(VALUES),
+        'rules': list(RULES),
+        'strategies': list(strategies),
+        'engine': engine,
+        'seed': seed,
+        'games': games,
+        'rows': sum(rows for name, rows in chunks),
+        'chunks': [{'name': name, 'rows': rows} for name, rows in chunks],
+    }
+    with open(os.path.join(directory, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=1)
+    return manifest['rows']
+
+
+def read_chunks(directory, columns=None):
+    """Yield every chunk of an export as a dict of memory-mapped columns"""
+    with open(os.path.join(directory, 'manifest.json')) as file:
+        manifest = json.load(file)
+    for chunk in manifest['chunks']:
+        path = os.path.join(directory, chunk['name'])
+        yield {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in (columns or manifest['columns'])
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--seats', nargs=2, default=['heuristic', 'heuristic'],
+                        choices=sorted(STRATEGIES), metavar='STRATEGY',
+                        help=f"strategies of seat 0 and seat 1 ({', '.join(sorted(STRATEGIES))})")
+    parser.add_argument('--out', required=True, help="directory the chunks are written to")
+    parser.add_argument('--engine', default='compact', choices=sorted(ENGINES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    rows = export(args.games, args.out, args.seats, args.engine, args.seed, args.processes,
+                  args.shard_size, args.chunk_rows)
+    elapsed = time.perf_counter() - started
+    print(f"Exported {rows:,} decisions from {args.games:,} games in {elapsed:.1f}s to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ import './App.css';
 const API_URL = 'http://localhost:5000/api';
 
 function App() {
+  const [gameId, setGameId] = useState(null);
   const [gameState, setGameState] = useState(null);
   const [selectedCard, setSelectedCard] = useState(null);
   const [message, setMessage] = useState('');
@@ -23,6 +24,7 @@ function App() {
   const startNewGame = async () => {
     try {
       const response = await axios.post(`${API_URL}/new-game`);
+      setGameId(response.data.game_id);
       setGameState(response.data);
       setMessage('Game started! Your turn.');
       setIsAITurn(false);
@@ -42,7 +44,9 @@ function App() {
   const handleAITurn = async () => {
     setIsAITurn(true);
     try {
-      const response = await axios.post(`${API_URL}/ai-move`);
+      const response = await axios.post(`${API_URL}/ai-move`, {
+        game_id: gameId
+      });
       const newState = response.data;
       setGameState(newState);
 
@@ -78,6 +82,7 @@ function App() {
 
     try {
       const response = await axios.post(`${API_URL}/ask-cards`, {
+        game_id: gameId,
         from_player: 0,
         to_player: 1,
         value: selectedCard.split(' ')[0]
@@ -0,0 +1,764 @@
+import base64
+import json
+import random
+import struct
+import sys
+
+from deck import LazyDeck
+from tracker import TableTracker, odds
+
+SUITS = ('Hearts', 'Diamonds', 'Clubs', 'Spades')
+VALUES = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+# Built once at import: the rank of every value and the label of every card
+VALUE_RANKS = {value: rank for rank, value in enumerate(VALUES, 2)}
+CARD_LABELS = {(suit, value): sys.intern(f"{value} of {suit}") for value in VALUES for suit in SUITS}
+MIN_SEATS, MAX_SEATS = 2, 8
+MAX_DECKS = 8
+
+class Card:
+    def __init__(self, suit, value):
+        self.suit = suit
+        self.value = value
+        # Add rank for sorting
+        self.rank = self.get_rank()
+        self.label = CARD_LABELS.get((suit, value)) or f"{value} of {suit}"
+
+    def __str__(self):
+        return self.label
+
+    def get_rank(self):
+        # Convert face cards to numeric values for sorting
+        if self.value in VALUE_RANKS:
+            return VALUE_RANKS[self.value]
+        return int(self.value)
+
+    def __lt__(self, other):
+        return self.rank < other.rank
+
+# The 52 cards in deck order, shared by every game as cards never change
+CARDS = tuple(Card(suit, value) for suit in SUITS for value in VALUES)
+# Number of every card in snapshots, the same in every engine: rank * 4 + suit
+CARD_IDS = {card: VALUES.index(card.value) * 4 + SUITS.index(card.suit) for card in CARDS}
+CARDS_BY_ID = tuple(sorted(CARDS, key=CARD_IDS.get))
+
+
+def _rng_state(rng):
+    """``rng.getstate()`` as JSON data, with the Mersenne Twister words packed in base64"""
+    version, words, gauss = rng.getstate()
+    packed = base64.b64encode(struct.pack(f'<{len(words)}I', *words)).decode('ascii')
+    return [version, packed, gauss]
+
+
+def _restore_rng(state):
+    version, packed, gauss = state
+    data = base64.b64decode(packed)
+    rng = random.Random()
+    rng.setstate((version, struct.unpack(f'<{len(data) // 4}I', data), gauss))
+    return rng
+
+
+class GoFishGame:
+    # Container used for each player's hand
+    hand_class = list
+    # Deck dealing the cards; deck.ShuffledDeck shuffles them all up front instead
+    deck_class = LazyDeck
+    # Optional DecisionCache shared by all games
+    decision_cache = None
+    # Optional policy.Policy asked before the heuristics; see policy.install_policy
+    policy = None
+    # Weights of the heuristic AI; tournaments can give a seat its own values
+    high_probability_threshold = 0.3  # Chance above which an ask is worth making
+    behavior_probability_threshold = 0.2  # Chance that makes an opponent's recent ask worth copying
+    late_game_score_bonus = 1.2  # Value high cards more in late game
+    success_rate_weight = 1.0  # How much past successes with a value raise its score
+
+    def __init__(self, rng=None, seats=2, decks=1, ai_seats=None):
+        """Deal a game for ``seats`` players from a shoe of ``decks`` decks.
+
+        ``ai_seats`` lists the seats the AI plays; by default every seat but
+        seat 0, which is the human's.
+        """
+        if not MIN_SEATS <= seats <= MAX_SEATS:
+            raise ValueError(f"A table has {MIN_SEATS} to {MAX_SEATS} seats")
+        if not 1 <= decks <= MAX_DECKS:
+            raise ValueError(f"A shoe has 1 to {MAX_DECKS} decks")
+        ai_seats = range(1, seats) if ai_seats is None else sorted(set(ai_seats))
+        if not all(0 <= seat < seats for seat in ai_seats):
+            raise ValueError("AI seats must be seats at the table")
+        # Source of randomness for shuffling; defaults to the random module
+        self.rng = rng if rng is not None else random
+        self.decks = decks
+        self.deck = []
+        self.players = [self.hand_class() for _ in range(seats)]  # Player 0 is the human by default
+        self.current_player = 0
+        self.suits = list(SUITS)
+        self.values = list(VALUES)
+        self.books = [0] * seats  # Track books for each player
+        self.booked_counts = dict.fromkeys(self.values, 0)  # Books made of each value
+        self.booked_values = set()  # Values with every copy collected as books
+        # Number of cards of each value in each hand, kept up to date on every move
+        self.value_counts = [self._new_counts(hand) for hand in self.players]
+        # Bumped whenever a hand changes, so its JSON can be cached until then
+        self.hand_versions = [0] * seats
+        self._hand_json = [None] * seats
+        # Seat the AI plays, and the memory it keeps for every AI seat
+        self.ai_memories = {seat: self._new_ai_memory(seat) for seat in ai_seats}
+        self.ai_player = ai_seats[0] if ai_seats else None
+        self.ai_memory = self.ai_memories.get(self.ai_player)
+        # Moves played so far, and an optional callback receiving each move as a dict
+        self.move_count = 0
+        self.on_move = None
+        self.initialize_deck()
+        self.deal_cards()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Callbacks belong to whoever is watching the game, not to the game
+        state['on_move'] = None
+        # Cached hand JSON is rebuilt on demand
+        state['_hand_json'] = [None] * len(self.players)
+        if state['rng'] is random:
+            state['rng'] = None
+        return state
+
+    def __setstate__(self, state):
+        if state['rng'] is None:
+            state['rng'] = random
+        self.__dict__.update(state)
+
+    def snapshot(self):
+        """The game's state as plain JSON data, which from_snapshot() rebuilds it from.
+
+        Cards are stored by number and the rng by its state, so loading a
+        snapshot creates no objects of the snapshot's choosing.
+        """
+        card_id = self._card_id
+        return {
+            'decks': self.decks,
+            'hands': [[card_id(card) for card in hand] for hand in self.players],
+            'deck': [card_id(card) for card in self.deck],  # Cards left, in deck order
+            'rng': None if self.rng is random else _rng_state(self.rng),
+            'current_player': self.current_player,
+            'books': list(self.books),
+            'booked_counts': list(self.booked_counts.values()),
+            'move_count': self.move_count,
+            'ai_player': self.ai_player,
+            'ai_memories': [
+                [seat, self._memory_state(memory)] for seat, memory in self.ai_memories.items()
+            ],
+        }
+
+    @classmethod
+    def from_snapshot(cls, state):
+        """Rebuild a game from snapshot()"""
+        game = cls.__new__(cls)
+        game.rng = random if state['rng'] is None else _restore_rng(state['rng'])
+        game.decks = state['decks']
+        card = game._card
+        game.deck = game.deck_class([card(number) for number in state['deck']], None)
+        game.players = []
+        for numbers in state['hands']:
+            hand = game.hand_class()
+            hand.extend(card(number) for number in numbers)
+            game.players.append(hand)
+        seats = len(game.players)
+        game.current_player = state['current_player']
+        game.suits = list(SUITS)
+        game.values = list(VALUES)
+        game.books = list(state['books'])
+        game.booked_counts = dict(zip(game.values, state['booked_counts']))
+        game.booked_values = {
+            value for value, count in game.booked_counts.items() if count == game.decks
+        }
+        game.value_counts = [game._new_counts(hand) for hand in game.players]
+        game.hand_versions = [0] * seats
+        game._hand_json = [None] * seats
+        for seat, hand in enumerate(game.players):
+            for held in hand:
+                game._count_change(seat, held.value, 1)
+        game.ai_memories = {
+            seat: game._restore_memory(seat, memory) for seat, memory in state['ai_memories']
+        }
+        game.ai_player = state['ai_player']
+        game.ai_memory = game.ai_memories.get(game.ai_player)
+        game.move_count = state['move_count']
+        game.on_move = None
+        return game
+
+    def _card_id(self, card):
+        return CARD_IDS[card]
+
+    def _card(self, number):
+        return CARDS_BY_ID[number]
+
+    def _memory_state(self, memory):
+        state = {}
+        for key, item in memory.items():
+            if key in ('value_scores', 'last_strategy'):
+                # A cache, and how this process made its last decision; replayed
+                # moves make neither, so they are left out and start afresh
+                continue
+            if key == 'opponents':
+                item = item.state()
+            elif isinstance(item, set):
+                item = sorted(item)
+            elif isinstance(item, tuple):
+                item = list(item)
+            state[key] = item
+        return state
+
+    def _restore_memory(self, seat, state):
+        # A fresh memory tells which fields are sets and tuples
+        memory = self._new_ai_memory(seat)
+        for key, item in state.items():
+            if key == 'opponents':
+                item = TableTracker.from_state(self.values, item)
+            elif isinstance(memory[key], set):
+                item = set(item)
+            elif isinstance(memory[key], tuple):
+                item = tuple(item)
+            memory[key] = item
+        return memory
+
+    def _new_ai_memory(self, seat):
+        # Enhanced AI memory
+        return {
+            # Bounds on every opponent's cards; whatever they hold so far is unseen
+            'opponents': TableTracker(self.values, {
+                other: len(hand) for other, hand in enumerate(self.players) if other != seat
+            }),
+            'last_target': None,  # Seat the AI asked last
+            'deck_size': len(self.deck),  # Cards left in the deck at the AI's last turn
+            'late_game': False,  # Deck had fewer than 10 cards at the AI's last turn
+            'asked_cards': set(),  # Cards AI has asked for
+            'received_cards': set(),  # Cards AI has received from player
+            'player_asked_for': {},  # Cards player has asked for, most recent last
+            'player_received': set(),  # Cards player has received
+            'last_asked_value': None,  # Last value AI asked for
+            'last_strategy': None,  # How the AI picked its last ask
+            'consecutive_failures': 0,  # Number of consecutive failed requests
+            'card_probabilities': {},  # Probability of cards being in player's hand
+            'odds_inputs': (),  # Bounds and hand size the probabilities were worked out from
+            'player_behavior': {},  # Track player's asking patterns
+            'value_scores': {},  # Cached _get_card_value_score results
+            'last_player_ask': None,  # Last card player asked for
+            'successful_asks': {},  # Track successful asks for each card value
+            'failed_asks': {},  # Track failed asks for each card value
+            'turn_count': 0  # Track number of turns
+        }
+
+    def set_ai_player(self, seat):
+        """Let the AI play the given seat, keeping a separate memory per seat"""
+        if seat not in self.ai_memories:
+            self.ai_memories[seat] = self._new_ai_memory(seat)
+        self.ai_player = seat
+        self.ai_memory = self.ai_memories[seat]
+
+    def initialize_deck(self):
+        self.deck = self.deck_class(CARDS * self.decks, self.rng)
+
+    def deal_cards(self):
+        # Deal 5 cards to each player
+        for _ in range(5):
+            for player_index in range(len(self.players)):
+                self._draw(player_index)
+
+    def _draw(self, player_index):
+        """Move the top card of the deck to a player's hand, if there is one"""
+        if not self.deck:
+            return None
+        new_card = self.deck.draw(self.rng)
+        self.players[player_index].append(new_card)
+        self.players[player_index].sort()
+        self._count_change(player_index, new_card.value, 1)
+        for seat, memory in self.ai_memories.items():
+            if seat != player_index:
+                memory['opponents'].drew(player_index)
+        return new_card
+
+    def _new_counts(self, hand):
+        """Cards of each value in a new ``hand``, kept up to date by _count_change()"""
+        return dict.fromkeys(self.values, 0)
+
+    def _count_change(self, player_index, value, delta):
+        """Track a change in how many cards of a value a player holds"""
+        counts = self.value_counts[player_index]
+        counts[value] += delta
+        self.hand_versions[player_index] += 1
+
+    def hand_json(self, player_index):
+        """A player's hand as a JSON list of card labels, encoded once per change"""
+        version = self.hand_versions[player_index]
+        cached = self._hand_json[player_index]
+        if cached is None or cached[0] != version:
+            cached = self._hand_json[player_index] = (
+                version, json.dumps([str(card) for card in self.players[player_index]]))
+        return cached[1]
+
+    def human_hands_json(self):
+        """The hands of the seats people play, as a JSON object keyed by seat"""
+        return '{' + ', '.join(
+            f'"{seat}": {self.hand_json(seat)}'
+            for seat in range(len(self.players)) if seat not in self.ai_memories
+        ) + '}'
+
+    def check_for_sets(self, player_index):
+        sets = []
+        
+        # The counts are kept up to date, so only the hand of a set is scanned
+        for value, count in self.value_counts[player_index].items():
+            # With several decks a hand can hold more than one set of a value
+            for _ in range(count // 4):
+                sets.append(value)
+                # Remove the set from player's hand
+                kept = []
+                removed = 0
+                for card in self.players[player_index]:
+                    if removed < 4 and card.value == value:
+                        removed += 1
+                    else:
+                        kept.append(card)
+                self.players[player_index] = kept
+                self._book(player_index, value)
+        
+        return sets
+
+    def _book(self, player_index, value):
+        """Account for a set of ``value`` the player just laid down"""
+        self._count_change(player_index, value, -4)
+        # Increment books count
+        self.books[player_index] += 1
+        self.booked_counts[value] += 1
+        if self.booked_counts[value] == self.decks:
+            self.booked_values.add(value)
+        for seat, memory in self.ai_memories.items():
+            if seat != player_index:
+                memory['opponents'].booked(player_index, value)
+
+    def ask_for_cards(self, from_player, to_player, value):
+        matching_cards = []
+        if self.value_counts[to_player].get(value):
+            matching_cards = [card for card in self.players[to_player] if card.value == value]
+        
+        if matching_cards:
+            # Transfer matching cards
+            self.players[from_player].extend(matching_cards)
+            self.players[to_player] = [card for card in self.players[to_player] if card.value != value]
+            # Sort the receiving player's hand
+            self.players[from_player].sort()
+            self._count_change(from_player, value, len(matching_cards))
+            self._count_change(to_player, value, -len(matching_cards))
+            
+            self._remember_ask(from_player, to_player, value, len(matching_cards))
+            return True, matching_cards
+        else:
+            # Go fish
+            self._draw(from_player)
+            
+            self._remember_ask(from_player, to_player, value, 0)
+            return False, []
+
+    def _remember_ask(self, from_player, to_player, value, received):
+        """Record an ask that got ``received`` cards in the memory of every AI seat"""
+        for seat, memory in self.ai_memories.items():
+            if from_player == seat:  # If AI is asking
+                memory['asked_cards'].add(value)
+                memory['last_asked_value'] = value
+                memory['last_target'] = to_player
+                # Either way the player has none of the value left
+                memory['opponents'].cleared(to_player, value)
+                if received:
+                    memory['successful_asks'][value] = memory['successful_asks'].get(value, 0) + 1
+                    memory['received_cards'].add(value)
+                else:
+                    memory['failed_asks'][value] = memory['failed_asks'].get(value, 0) + 1
+                # The value's success rate changed
+                memory['value_scores'].pop(value, None)
+            else:  # If another player is asking
+                memory['player_asked_for'].pop(value, None)
+                memory['player_asked_for'][value] = None
+                memory['last_player_ask'] = value
+                # The servers only let a person ask for values in their hand, while
+                # the AI may ask for anything, so only a person's ask shows a holding
+                memory['opponents'].asked(from_player, value, received, from_player not in self.ai_memories)
+                if to_player != seat:
+                    memory['opponents'].cleared(to_player, value)
+                if received:
+                    memory['player_received'].add(value)
+
+    def is_game_over(self):
+        # Game is over if:
+        # 1. Deck is empty AND fewer than two players have cards, OR
+        # 2. All books have been collected (13 per deck)
+        if sum(self.books) == 13 * self.decks:
+            return True
+        return not self.deck and sum(1 for hand in self.players if hand) < 2
+
+    def get_winner(self):
+        # If game isn't over, no winner yet
+        if not self.is_game_over():
+            return None
+            
+        # If all books are collected, winner is the one with more books
+        if sum(self.books) == 13 * self.decks:
+            return self._most_books()
+                
+        # Otherwise the deck is empty and at most one player has cards left:
+        # the players who are out compete on books, a tie being a draw
+        out = [seat for seat, hand in enumerate(self.players) if not hand]
+        return self._most_books(out or None)
+
+    def _most_books(self, seats=None):
+        """Seat with the most books among ``seats`` (all by default), or None on a tie"""
+        if seats is None:
+            seats = range(len(self.players))
+        most = max(self.books[seat] for seat in seats)
+        leaders = [seat for seat in seats if self.books[seat] == most]
+        return leaders[0] if len(leaders) == 1 else None
+
+    def _next_player(self, player_index):
+        """Seat whose turn follows ``player_index``, skipping players who are out"""
+        seats = len(self.players)
+        for step in range(1, seats):
+            seat = (player_index + step) % seats
+            # A player without cards is out once the deck is empty
+            if self.deck or self.players[seat]:
+                return seat
+        return (player_index + 1) % seats
+
+    def take_turn(self, from_player, to_player, value):
+        """Play a player's ask: check for sets and pass the turn on a miss"""
+        deck_size = len(self.deck)
+        success, cards = self.ask_for_cards(from_player, to_player, value)
+        
+        # Check for sets after the move
+        sets = self.check_for_sets(from_player)
+        
+        # Switch turns if the move wasn't successful
+        if not success:
+            self.current_player = self._next_player(from_player)
+        
+        self._log_move('ask', from_player, to_player, value, success, sets, deck_size)
+        return success, cards, sets
+
+    def draw_or_pass(self, player_index):
+        """Turn of a player without cards: draw one, or pass once the deck is empty"""
+        deck_size = len(self.deck)
+        new_card = self._draw(player_index)
+        if new_card is None:
+            self.current_player = self._next_player(player_index)
+        self._log_move('draw', player_index, None, None, False, [], deck_size)
+        return new_card
+
+    def ai_make_move(self, choose=None):
+        """Play one AI turn.
+
+        ``choose`` optionally replaces ``_get_best_card_to_ask``: it is called
+        with the game and returns the value to ask for.
+        """
+        deck_size = len(self.deck)
+        asked = bool(self.players[self.ai_player])
+        success, cards, sets = self._play_ai_move(choose)
+        value = self.ai_memory['last_asked_value'] if asked else None
+        target = self.ai_memory['last_target'] if asked else None
+        self._log_move('ai', self.ai_player, target, value, success, sets, deck_size)
+        return success, cards, sets
+
+    def replay_move(self, move):
+        """Play a move recorded by on_move again"""
+        if move['type'] == 'ask':
+            self.take_turn(move['player'], move['to'], move['value'])
+        elif move['type'] == 'draw':
+            self.draw_or_pass(move['player'])
+        else:
+            # Ask for the logged value instead of deciding again
+            self.set_ai_player(move['player'])
+            self.ai_make_move(lambda game: move['value'])
+
+    def _log_move(self, kind, player, to_player, value, success, sets, deck_size):
+        self.move_count += 1
+        if self.on_move is not None:
+            self.on_move({
+                'type': kind,
+                'player': player,
+                'to': to_player,
+                'value': value,
+                'success': success,
+                'drawn': deck_size - len(self.deck),
+                'sets': sets,
+                'books': list(self.books),
+            })
+
+    def _play_ai_move(self, choose):
+        ai = self.ai_player
+        # Check if AI has no cards
+        if not self.players[ai]:
+            # If deck is empty, the AI is out
+            if not self.deck:
+                self.current_player = self._next_player(ai)  # Switch back to player
+                return False, [], []
+            # If deck has cards, draw one
+            new_card = self._draw(ai)
+            return False, [new_card], []
+
+        # Update AI memory based on game state
+        self._update_ai_memory()
+
+        # Get the best card value to ask for
+        if choose:
+            best_value = choose(self)
+            self.ai_memory['last_strategy'] = 'chooser'
+        else:
+            best_value = self._get_best_card_to_ask()
+        
+        # Ask the opponent most likely to have the value
+        success, cards = self.ask_for_cards(ai, self._choose_target(best_value), best_value)
+        
+        # Check for sets after the move
+        sets = self.check_for_sets(ai)
+        
+        # Handle unsuccessful moves
+        if not success:
+            if not self.deck:
+                self.current_player = self._next_player(ai)
+                return False, [], sets
+            
+            # Draw a card if available
+            new_card = self._draw(ai)
+            self.current_player = self._next_player(ai)
+            return False, [new_card], sets
+
+        return success, cards, sets
+
+    def _choose_target(self, value):
+        """Opponent to ask for ``value``: one with cards, by the AI's bounds on its holding"""
+        ai = self.ai_player
+        opponents = [seat for seat in range(len(self.players)) if seat != ai]
+        if len(opponents) == 1:
+            return opponents[0]
+        tracker = self.ai_memory['opponents']
+        unseen = self._unseen(value)
+        return max(opponents, key=lambda seat: (
+            bool(self.players[seat]),
+            tracker.bounds(seat, value, unseen),
+            len(self.players[seat]),
+        ))
+
+    def _unseen(self, value):
+        """Cards of ``value`` the AI cannot see: not in its hand and not booked"""
+        return 4 * (self.decks - self.booked_counts[value]) - self.value_counts[self.ai_player][value]
+
+    def _update_ai_memory(self):
+        """Update AI's memory based on current game state.
+
+        The AI's hand and known cards are kept up to date as cards move, so
+        only the deck size and the probabilities need refreshing here.
+        """
+        # Update deck size in memory
+        self.ai_memory['deck_size'] = len(self.deck)
+        
+        # Value scores change once when the late game starts
+        late_game = self.ai_memory['deck_size'] < 10
+        if late_game != self.ai_memory['late_game']:
+            self.ai_memory['late_game'] = late_game
+            self.ai_memory['value_scores'].clear()
+        
+        # Update card probabilities
+        self._update_card_probabilities()
+        
+        # Increment turn count
+        self.ai_memory['turn_count'] += 1
+
+    def _unseen_counts(self):
+        """_unseen() of every value, as a dict in the order of the values"""
+        booked = self.booked_counts
+        return {
+            value: 4 * (self.decks - booked[value]) - count
+            for value, count in self.value_counts[self.ai_player].items()
+        }
+
+    def _update_card_probabilities(self):
+        """Update the chance that an opponent holds each value, from what the AI has seen"""
+        unseen = self._unseen_counts()
+        # Every card outside the deck, the books and the AI's hand is with an opponent
+        held = 52 * self.decks - len(self.deck) - 4 * sum(self.books) - len(self.players[self.ai_player])
+        lows, highs = self.ai_memory['opponents'].totals(unseen)
+        self.ai_memory['card_probabilities'] = odds(unseen, lows, highs, held)
+        # The odds follow from these integers, which decision keys use instead
+        self.ai_memory['odds_inputs'] = (*lows, *highs, held)
+
+    def _get_best_card_to_ask(self):
+        """Determine the best card value to ask for, from the policy or the cache if possible"""
+        if self.policy is not None:
+            value = self.policy(self)
+            # A policy returns None for states it has no answer for
+            if value is not None:
+                self.ai_memory['last_strategy'] = 'policy'
+                return value
+        if self.decision_cache is None:
+            return self._compute_best_card_to_ask()
+        key = self._decision_key()
+        value = self.decision_cache.get(key)
+        if value is None:
+            value = self._compute_best_card_to_ask()
+            self.decision_cache.put(key, value)
+        else:
+            self.ai_memory['last_strategy'] = 'cache'
+        return value
+
+    def _decision_key(self):
+        """Canonical signature of everything _compute_best_card_to_ask reads, hashed to an int.
+
+        Inputs are reduced to what the decision depends on: the integers the
+        odds are worked out from rather than the odds, the success counts of
+        values that have had a success (the others score alike), and the
+        highest value not yet asked for rather than all of them. Only
+        integers and floats go in, whose hashes are the same in every process,
+        so keys stay valid in a cache saved to a file.
+        """
+        memory = self.ai_memory
+        failed_asks = memory['failed_asks']
+        asked = memory['asked_cards']
+        top = 0
+        for value in self.values[::-1]:
+            if value not in asked:
+                top = VALUE_RANKS[value]
+                break
+        return hash((
+            *self.value_counts[self.ai_player].values(),
+            *memory['odds_inputs'],
+            memory['late_game'],
+            top,
+            tuple(sorted((VALUE_RANKS[value], successes, failed_asks.get(value, 0))
+                         for value, successes in memory['successful_asks'].items())),
+            tuple(VALUE_RANKS[value] for value in tuple(memory['player_asked_for'])[-3:]),
+            # A seat with its own weights must not be served another seat's asks
+            self.high_probability_threshold, self.behavior_probability_threshold,
+            self.late_game_score_bonus, self.success_rate_weight,
+        ))
+
+    def _compute_best_card_to_ask(self):
+        """Determine the best card value to ask for using multiple strategies"""
+        # Strategy 1: Look for cards that would complete sets
+        potential_sets = self._find_potential_sets()
+        if potential_sets:
+            self.ai_memory['last_strategy'] = 'potential_sets'
+            return self._select_best_potential_set(potential_sets)
+
+        # Strategy 2: Ask for cards with high probability
+        high_prob_cards = self._get_high_probability_cards()
+        if high_prob_cards:
+            self.ai_memory['last_strategy'] = 'high_probability'
+            return high_prob_cards[0]
+
+        # Strategy 3: Ask for cards that AI has multiple of
+        multiple_cards = self._get_cards_with_multiple()
+        if multiple_cards:
+            self.ai_memory['last_strategy'] = 'multiple'
+            return self._select_best_multiple_card(multiple_cards)
+
+        # Strategy 4: Ask for cards based on player behavior
+        behavior_based = self._get_behavior_based_card()
+        if behavior_based:
+            self.ai_memory['last_strategy'] = 'behavior'
+            return behavior_based
+
+        # Strategy 5: Ask for high-value cards
+        self.ai_memory['last_strategy'] = 'high_value'
+        return self._get_high_value_card()
+
+    def _select_best_potential_set(self, potential_sets):
+        """Select the best potential set to complete based on probability"""
+        best_value = None
+        best_score = -1
+        
+        for value in potential_sets:
+            # Calculate score based on probability and value
+            prob = self.ai_memory['card_probabilities'].get(value, 0)
+            value_score = self._get_card_value_score(value)
+            score = prob * value_score
+            
+            if score > best_score:
+                best_score = score
+                best_value = value
+        
+        return best_value or potential_sets[0]
+
+    def _get_high_probability_cards(self):
+        """Get cards with high probability of being in player's hand"""
+        threshold = self.high_probability_threshold
+        high_prob_cards = [
+            value for value, prob in self.ai_memory['card_probabilities'].items()
+            if prob > threshold
+        ]
+        return sorted(high_prob_cards, key=lambda x: self._get_card_value_score(x), reverse=True)
+
+    def _select_best_multiple_card(self, multiple_cards):
+        """Select the best card to ask for among multiple cards"""
+        return max(multiple_cards, key=lambda x: (
+            self.ai_memory['card_probabilities'].get(x, 0) * 
+            self._get_card_value_score(x)
+        ))
+
+    def _get_behavior_based_card(self):
+        """Get card to ask for based on player's behavior patterns"""
+        if not self.ai_memory['player_asked_for']:
+            return None
+            
+        # Look for patterns in player's asking behavior
+        recent_asks = list(self.ai_memory['player_asked_for'])[-3:]
+        if recent_asks:
+            # If player has asked for high-value cards recently, they might have them
+            if all(self._get_card_value_score(card) > 10 for card in recent_asks):
+                return self._get_high_value_card()
+            
+            # If player has asked for specific suits, they might have more cards of that suit
+            for card in recent_asks:
+                if self.ai_memory['card_probabilities'].get(card, 0) > self.behavior_probability_threshold:
+                    return card
+        
+        return None
+
+    def _get_card_value_score(self, value):
+        """Strategic value of a card, cached until its inputs change"""
+        score = self.ai_memory['value_scores'].get(value)
+        if score is None:
+            score = self.ai_memory['value_scores'][value] = self._compute_card_value_score(value)
+        return score
+
+    def _compute_card_value_score(self, value):
+        """Calculate the strategic value of a card"""
+        # Look the rank up in the table built at import
+        if value in VALUE_RANKS:
+            base_score = VALUE_RANKS[value]
+        else:
+            # Not a card value; int() rejects anything but numbers
+            base_score = int(value)
+        
+        # Adjust score based on game state
+        if self.ai_memory['deck_size'] < 10:  # Late game
+            base_score *= self.late_game_score_bonus
+        
+        # Adjust based on successful asks
+        success_rate = self.ai_memory['successful_asks'].get(value, 0) / (
+            self.ai_memory['successful_asks'].get(value, 0) + 
+            self.ai_memory['failed_asks'].get(value, 0) + 1
+        )
+        
+        return base_score * (1 + self.success_rate_weight * success_rate)
+
+    def _find_potential_sets(self):
+        """Find cards that would complete sets in AI's hand"""
+        # Return values that appear 2 or 3 times (potential for sets)
+        return [value for value, count in self.value_counts[self.ai_player].items() if 2 <= count <= 3]
+
+    def _get_cards_with_multiple(self):
+        """Get cards that AI has multiple of"""
+        return [value for value, count in self.value_counts[self.ai_player].items() if count >= 2]
+
+    def _get_high_value_card(self):
+        """Get a high-value card to ask for"""
+        for value in self.values[::-1]:  # Iterate from highest to lowest
+            if value not in self.ai_memory['asked_cards']:
+                return value
+        return self.values[0]  # Fallback to lowest card
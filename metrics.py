@@ -0,0 +1,255 @@
+"""Counters, histograms and gauges in the Prometheus text format.
+
+``instrument_game`` wraps the hot methods of a game class with timers, so the
+servers can report how long asks, set checks, AI moves and each of the AI's
+strategies take, and which strategy picked each ask. Serve ``render()`` as
+``/metrics`` and point Prometheus at it.
+"""
+import threading
+import weakref
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+
+# Upper bounds in seconds, from engine calls (microseconds) to slow requests
+LATENCY_BUCKETS = (
+    0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+GAME_METHODS = ('ask_for_cards', 'check_for_sets', 'ai_make_move', '_update_ai_memory')
+STRATEGY_METHODS = {
+    '_find_potential_sets': 'potential_sets',
+    '_get_high_probability_cards': 'high_probability',
+    '_get_cards_with_multiple': 'multiple',
+    '_get_behavior_based_card': 'behavior',
+    '_get_high_value_card': 'high_value',
+}
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Sharded:
+    """Base of metrics that every thread updates in its own shard.
+
+    Updates take no lock; the shards of all threads are added up when the
+    metrics are rendered. When a thread ends its shard is folded into the
+    totals of the finished threads, so servers starting a thread per request
+    keep a shard per live thread only.
+    """
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._local = threading.local()
+        self._shards = []
+        self._finished = {}  # Totals of the threads that have ended
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = self._local.shard = {}
+        with self._lock:
+            self._shards.append(shard)
+        weakref.finalize(threading.current_thread(), self._retire, shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            self._shards.remove(shard)
+            for label_values, value in shard.items():
+                self._add(self._finished, label_values, value)
+
+    def _totals(self):
+        """Values of all threads added up, per label values"""
+        with self._lock:
+            shards = list(self._shards)
+            totals = {label_values: self._copy(value) for label_values, value in self._finished.items()}
+        for shard in shards:
+            # Copying a dict is atomic, even while its thread updates it
+            for label_values, value in dict(shard).items():
+                self._add(totals, label_values, value)
+        return totals
+
+
+class Counter(_Sharded):
+    type = 'counter'
+
+    def inc(self, *label_values):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + 1
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def _add(totals, label_values, value):
+        totals[label_values] = totals.get(label_values, 0) + value
+
+    def samples(self):
+        for label_values, value in sorted(self._totals().items()):
+            yield self.name + _format_labels(self.labels, label_values), value
+
+
+class Histogram(_Sharded):
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value, *label_values):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        # Per label values: count per bucket (the last one is +Inf), then the sum
+        entry = shard.get(label_values)
+        if entry is None:
+            entry = shard[label_values] = [0] * (len(self.buckets) + 2)
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def time(self, *label_values):
+        """Decorator that observes the run time of the wrapped function"""
+        def decorator(function):
+            @wraps(function)
+            def timed(*args, **kwargs):
+                started = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(perf_counter() - started, *label_values)
+            return timed
+        return decorator
+
+    @staticmethod
+    def _copy(entry):
+        return list(entry)
+
+    @staticmethod
+    def _add(totals, label_values, entry):
+        total = totals.get(label_values)
+        if total is None:
+            totals[label_values] = list(entry)
+        else:
+            for index, value in enumerate(entry):
+                total[index] += value
+
+    def samples(self):
+        for label_values, entry in sorted(self._totals().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), entry):
+                cumulative += count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                yield f'{self.name}_bucket{labels}', cumulative
+            labels = _format_labels(self.labels, label_values)
+            yield f'{self.name}_sum{labels}', entry[-1]
+            yield f'{self.name}_count{labels}', cumulative
+
+
+class Gauge:
+    """Gauge whose value is read from a function when the metrics are rendered"""
+
+    def __init__(self, name, help, function):
+        self.name = name
+        self.help = help
+        self.type = 'gauge'
+        self.function = function
+
+    def samples(self):
+        yield self.name, self.function()
+
+
+class Metrics:
+    """A set of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        # Asking twice for a metric returns the first one
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, function):
+        return self._add(Gauge(name, help, function))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for sample, value in metric.samples():
+                lines.append(f'{sample} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()  # Shared by the servers
+
+
+def instrument_game(cls, registry=metrics):
+    """Time the hot methods of a game class and count the AI's strategies.
+
+    The class is changed in place, so every game it makes is measured;
+    instrumenting a class twice does nothing.
+    """
+    if cls.__dict__.get('_instrumented'):
+        return cls
+    engine_seconds = registry.histogram(
+        'gofish_engine_seconds', 'Time spent in game methods', ('method',))
+    strategy_seconds = registry.histogram(
+        'gofish_ai_strategy_seconds', 'Time spent in each AI strategy', ('strategy',))
+    decisions = registry.counter(
+        'gofish_ai_decisions_total', 'AI asks by the strategy that picked them', ('strategy',))
+
+    for name in GAME_METHODS:
+        if name != 'ai_make_move':
+            setattr(cls, name, engine_seconds.time(name)(getattr(cls, name)))
+    for name, strategy in STRATEGY_METHODS.items():
+        setattr(cls, name, strategy_seconds.time(strategy)(getattr(cls, name)))
+
+    ai_make_move = cls.ai_make_move
+
+    @wraps(ai_make_move)
+    def timed_ai_make_move(self, *args, **kwargs):
+        self.ai_memory['last_strategy'] = None
+        started = perf_counter()
+        try:
+            return ai_make_move(self, *args, **kwargs)
+        finally:
+            engine_seconds.observe(perf_counter() - started, 'ai_make_move')
+            # No strategy runs when the AI had no cards and only drew
+            decisions.inc(self.ai_memory['last_strategy'] or 'none')
+
+    cls.ai_make_move = timed_ai_make_move
+    cls._instrumented = True
+    return cls
+
+
+def route_timer(registry=metrics):
+    """Histogram of request latency and counter of responses for the servers"""
+    seconds = registry.histogram(
+        'gofish_http_request_seconds', 'Request latency by route', ('method', 'route'))
+    responses = registry.counter(
+        'gofish_http_responses_total', 'Responses by route and status', ('method', 'route', 'status'))
+
+    def record(method, route, status, elapsed):
+        seconds.observe(elapsed, method, route)
+        responses.inc(method, route, str(status))
+
+    return record
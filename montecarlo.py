@@ -0,0 +1,211 @@
+"""Determinization Monte Carlo AI.
+
+For every move the AI samples hidden states consistent with what it knows:
+the unseen cards are split between the opponent's hand and the deck within
+the bounds the AI's OpponentTracker has worked out for every value. Each
+candidate ask is then played out to the end of the game in every sample with
+the NumPy batch engine, and the ask with the best average book margin wins.
+
+Rollouts run in rounds, sized to the time left, until the per-move budget is
+used up. Rounds can also be farmed out to a thread or process pool; work that
+is not back by the deadline is ignored, so a loaded pool never delays the move.
+"""
+import threading
+import time
+from concurrent.futures import wait
+
+import numpy as np
+
+from batch import BatchGoFish
+
+DEFAULT_BUDGET = 0.05  # Seconds per move
+SAMPLES_PER_ROUND = 32  # Hidden states sampled per round of rollouts
+FIRST_ROUND_SAMPLES = 4  # Size of the first round when playing to a deadline
+ROLLOUT_STRATEGIES = ('greedy', 'greedy')
+ROLLOUT_TURNS = 200
+
+_rounds_lock = threading.Lock()  # Held by the thread playing a round to a deadline
+
+
+class Position:
+    """What the AI knows when it moves, in a form that can be sent to a worker"""
+
+    def __init__(self, game):
+        values = game.values
+        memory = game.ai_memory
+        self.seat = game.ai_player
+        self.counts = [game.value_counts[self.seat][value] for value in values]
+        # Legal asks: values the AI holds
+        self.candidates = [rank for rank, count in enumerate(self.counts) if count]
+        # Cards the AI cannot see: the opponent's hand and the deck
+        self.unseen = np.array([
+            rank for rank, value in enumerate(values) if value not in game.booked_values
+            for _ in range(4 - self.counts[rank])
+        ], dtype=np.int8)
+        self.opponent = 1 - self.seat
+        self.opponent_size = len(game.players[self.opponent])
+        self.deck_size = len(game.deck)
+        # Per value, the unseen cards that must be in the opponent's hand and
+        # the ones that must be in the deck
+        self.in_hand = []
+        self.in_deck = []
+        for rank, value in enumerate(values):
+            unseen = 0 if value in game.booked_values else 4 - self.counts[rank]
+            low, high = memory['opponents'].bounds(self.opponent, value, unseen)
+            self.in_hand.append(low)
+            self.in_deck.append(unseen - high)
+        self.books = list(game.books)
+
+
+def rollout_round(position, samples, rng):
+    """Play every candidate out in ``samples`` hidden states.
+
+    Returns the summed book margin of each candidate.
+    """
+    candidates = np.array(position.candidates)
+    # Deal the unseen cards in a random order, with the cards that must be in
+    # the opponent's hand first and the ones that must be in the deck last
+    keys = rng.random((samples, len(position.unseen)))
+    for rank in range(13):
+        low, excess = position.in_hand[rank], position.in_deck[rank]
+        if low or excess:
+            where = np.flatnonzero(position.unseen == rank)
+            picked = where[rng.random((samples, len(where))).argsort(axis=1)]
+            rows = np.arange(samples)[:, None]
+            keys[rows, picked[:, :low]] -= 1
+            keys[rows, picked[:, len(where) - excess:]] += 1
+    dealt = position.unseen[keys.argsort(axis=1)]
+    opponent_counts = (dealt[:, :position.opponent_size, None] == np.arange(13)).sum(axis=1)
+    # Shuffle the deck again so the cards forced into it are not all at the bottom
+    deck = dealt[:, position.opponent_size:]
+    decks = np.take_along_axis(deck, rng.random(deck.shape).argsort(axis=1), axis=1) << 2
+
+    games = len(candidates) * samples
+    counts = np.empty((games, 2, 13), dtype=np.int8)
+    counts[:, position.seat] = position.counts
+    counts[:, 1 - position.seat] = np.tile(opponent_counts, (len(candidates), 1))
+    batch = BatchGoFish.from_positions(
+        np.tile(decks, (len(candidates), 1)),
+        np.full(games, position.deck_size),
+        counts,
+        np.tile(position.books, (games, 1)),
+        np.full(games, position.seat),
+    )
+    batch.step(ROLLOUT_STRATEGIES, rng, ranks=np.repeat(candidates, samples))
+    batch.run(ROLLOUT_STRATEGIES, rng, max_turns=ROLLOUT_TURNS)
+    margins = batch.books[:, position.seat].astype(np.int32) - batch.books[:, 1 - position.seat]
+    return margins.reshape(len(candidates), samples).sum(axis=1)
+
+
+def run_rollouts(position, samples, deadline=None, rounds=1, seed=None):
+    """Play rounds until ``deadline`` (a time.time() value) or for ``rounds`` rounds.
+
+    Without a deadline every round plays ``samples`` hidden states. With one,
+    rounds start at FIRST_ROUND_SAMPLES and double up to ``samples``, but a
+    round only starts if the rounds so far say it ends by the deadline, and
+    is halved until it does. Returns the summed margins per candidate and
+    the number of samples behind them.
+    """
+    rng = np.random.default_rng(seed)
+    totals = np.zeros(len(position.candidates), dtype=np.int64)
+    played = 0
+    if deadline is None:
+        for _ in range(rounds):
+            totals += rollout_round(position, samples, rng)
+            played += samples
+        return totals, played
+
+    size = min(FIRST_ROUND_SAMPLES, samples)
+    timings = []  # (samples, seconds) of the rounds so far
+    while True:
+        # Rounds of different moves take turns: interleaved, each would keep
+        # waiting for the GIL between NumPy calls and overrun its deadline
+        if not _rounds_lock.acquire(timeout=max(deadline - time.time(), 0)):
+            break
+        try:
+            started = time.time()
+            while size and _round_time(timings, size) > deadline - started:
+                size //= 2
+            if not size:
+                break
+            totals += rollout_round(position, size, rng)
+            played += size
+            timings.append((size, time.time() - started))
+        finally:
+            _rounds_lock.release()
+        size = min(size * 2, samples)
+    return totals, played
+
+
+def _round_time(timings, size):
+    """Time a round of ``size`` samples should take, judging by earlier rounds"""
+    if not timings:
+        return 0.0
+    # Rounds cost a lot more than their samples, so a round takes no longer
+    # than a larger one did; beyond the largest, time grows with the samples
+    larger = [seconds for samples, seconds in timings if samples >= size]
+    if larger:
+        return max(larger)
+    samples, seconds = max(timings)
+    return seconds * size / samples
+
+
+class MonteCarloAI:
+    """Chooser for GoFishGame.ai_make_move that picks asks by rollouts.
+
+    Tables with more than two seats or more than one deck fall back to the
+    game's own strategies.
+
+    With a ``budget`` (seconds) rollouts continue until it is spent; with
+    ``budget=None`` exactly ``rounds`` rounds are played, which keeps seeded
+    runs reproducible. An ``executor`` (thread or process pool) gets
+    ``parallel`` extra rollout tasks per move.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, rounds=4, samples=SAMPLES_PER_ROUND,
+                 executor=None, parallel=0, seed=None):
+        self.budget = budget
+        self.rounds = rounds
+        self.samples = samples
+        self.executor = executor
+        self.parallel = parallel
+        self.rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()  # Guards rng when several threads play
+        self.last_samples = 0  # Hidden states behind the last decision
+
+    def __call__(self, game, rng=None):
+        deadline = time.time() + self.budget if self.budget is not None else None
+        if rng is None:
+            with self._lock:
+                rng = np.random.default_rng(self.rng.integers(2 ** 63))
+        # The batch engine plays two seats and one deck
+        if len(game.players) != 2 or game.decks != 1:
+            return game._get_best_card_to_ask()
+        position = Position(game)
+        if len(position.candidates) == 1:
+            return game.values[position.candidates[0]]
+
+        futures = []
+        if self.executor is not None:
+            futures = [
+                self.executor.submit(run_rollouts, position, self.samples, deadline, self.rounds,
+                                     rng.integers(2 ** 63))
+                for _ in range(self.parallel)
+            ]
+        totals, played = run_rollouts(position, self.samples, deadline, self.rounds, rng.integers(2 ** 63))
+        if futures:
+            # Only use help that arrives in time
+            timeout = max(deadline - time.time(), 0) if deadline is not None else None
+            done, late = wait(futures, timeout=timeout)
+            for future in late:
+                future.cancel()
+            for future in done:
+                if future.exception() is None:
+                    more_totals, more_played = future.result()
+                    totals += more_totals
+                    played += more_played
+        self.last_samples = played
+        if not played:
+            # The budget ran out before a single rollout
+            return game._get_best_card_to_ask()
+        return game.values[position.candidates[int(totals.argmax())]]
@@ -0,0 +1,182 @@
+"""Append-only move log of every game, kept in SQLite.
+
+A game is stored as the seed its deck was shuffled with, the options of its
+table and the moves played since, with a JSON snapshot of its state every
+few moves. Any process can rebuild a game from its latest snapshot and the
+moves after it, so servers can share games through the database, and
+finished games can be replayed offline:
+
+    python movelog.py games.db            # list the logged games
+    python movelog.py games.db GAME_ID    # replay one game move by move
+"""
+import argparse
+import json
+import random
+import sqlite3
+import threading
+
+from engines import ENGINES
+
+SNAPSHOT_EVERY = 20  # Moves between snapshots of a game
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    seed INTEGER NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS moves (
+    game_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    move TEXT NOT NULL,
+    PRIMARY KEY (game_id, seq)
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    game_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    state BLOB NOT NULL,
+    PRIMARY KEY (game_id, seq)
+);
+"""
+
+
+class MoveConflict(Exception):
+    """Another process logged a move of the same game first"""
+
+
+class MoveLog:
+    """SQLite store of game seeds, moves and snapshots.
+
+    Moves are numbered from 0 per game and a number can only be taken once,
+    so two processes playing the same game at the same time cannot both log
+    their move: the second one gets a MoveConflict.
+    """
+
+    def __init__(self, path, snapshot_every=SNAPSHOT_EVERY):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        # SQLite connections must stay on the thread that opened them
+        self._local = threading.local()
+        with self._db() as db:
+            db.executescript(SCHEMA)
+            try:
+                # Logs written before tables had options
+                db.execute("ALTER TABLE games ADD COLUMN options TEXT NOT NULL DEFAULT '{}'")
+            except sqlite3.OperationalError:
+                pass
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+        return db
+
+    def __contains__(self, game_id):
+        row = self._db().execute('SELECT 1 FROM games WHERE game_id = ?', (game_id,)).fetchone()
+        return row is not None
+
+    def create(self, game_id, seed, options=None):
+        """Log a new game; ``options`` are the keyword arguments it was made with"""
+        with self._db() as db:
+            db.execute('INSERT INTO games (game_id, seed, options) VALUES (?, ?, ?)',
+                       (game_id, seed, json.dumps(options or {})))
+
+    def _start(self, game_id, factory):
+        # The game as dealt, before any move
+        row = self._db().execute('SELECT seed, options FROM games WHERE game_id = ?', (game_id,)).fetchone()
+        if row is None:
+            return None
+        seed, options = row
+        return factory(rng=random.Random(seed), **json.loads(options))
+
+    def append(self, game_id, seq, moves, game=None):
+        """Log ``moves`` as moves ``seq``, ``seq + 1``, ...
+
+        ``game`` is the game after the moves; it is snapshotted whenever the
+        moves cross a multiple of ``snapshot_every``.
+        """
+        if not moves:
+            return
+        end = seq + len(moves)
+        try:
+            with self._db() as db:
+                db.executemany(
+                    'INSERT INTO moves (game_id, seq, move) VALUES (?, ?, ?)',
+                    [(game_id, seq + offset, json.dumps(move)) for offset, move in enumerate(moves)],
+                )
+                if game is not None and end // self.snapshot_every > seq // self.snapshot_every:
+                    db.execute(
+                        'INSERT OR REPLACE INTO snapshots (game_id, seq, state) VALUES (?, ?, ?)',
+                        (game_id, end, json.dumps(game.snapshot(), separators=(',', ':'))),
+                    )
+        except sqlite3.IntegrityError:
+            raise MoveConflict(game_id)
+
+    def moves(self, game_id, start=0):
+        rows = self._db().execute(
+            'SELECT move FROM moves WHERE game_id = ? AND seq >= ? ORDER BY seq', (game_id, start))
+        return [json.loads(move) for move, in rows]
+
+    def load(self, game_id, factory):
+        """Rebuild a game from its latest snapshot and the moves after it.
+
+        ``factory`` is the game class. Returns None for an unknown game.
+        """
+        db = self._db()
+        row = db.execute(
+            'SELECT state FROM snapshots WHERE game_id = ? ORDER BY seq DESC LIMIT 1', (game_id,)
+        ).fetchone()
+        state = None
+        if row is not None:
+            try:
+                state = json.loads(row[0])
+            except ValueError:
+                pass  # Pickled by an older version; never unpickled, the moves rebuild the game
+        if state is not None:
+            game = factory.from_snapshot(state)
+        else:
+            game = self._start(game_id, factory)
+            if game is None:
+                return None
+        self.catch_up(game_id, game)
+        return game
+
+    def catch_up(self, game_id, game):
+        """Replay the moves other processes logged since ``game`` was loaded"""
+        for move in self.moves(game_id, game.move_count):
+            game.replay_move(move)
+        return game
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help="SQLite file written by the server")
+    parser.add_argument('game_id', nargs='?', help="game to replay (default: list all games)")
+    parser.add_argument('--engine', default='classic', choices=sorted(ENGINES))
+    args = parser.parse_args(argv)
+    log = MoveLog(args.path)
+
+    if args.game_id is None:
+        rows = log._db().execute(
+            'SELECT games.game_id, COUNT(moves.seq) FROM games'
+            ' LEFT JOIN moves ON moves.game_id = games.game_id GROUP BY games.game_id')
+        for game_id, count in rows:
+            print(f"{game_id}  {count} moves")
+        return
+
+    if args.game_id not in log:
+        parser.error(f"no game {args.game_id}")
+    # Start from the seed rather than a snapshot to show every move
+    game = log._start(args.game_id, ENGINES[args.engine])
+    for move in log.moves(args.game_id):
+        game.replay_move(move)
+        print(f"{game.move_count:4d}  player {move['player']} {move['type']:4s} to={move['to']} "
+              f"value={move['value']} success={move['success']} drawn={move['drawn']} "
+              f"sets={move['sets']} books={game.books}")
+    print(f"Game over: {game.is_game_over()}  Winner: {game.get_winner()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+"""Learned and table-driven policies that pick the AI's asks.
+
+A policy replaces ``GoFishGame._get_best_card_to_ask``: installed with
+``install_policy``, it is asked first on every AI turn and the game's own
+strategies only decide when it has no answer. Policies read the state the
+training export records (export.py) and score many games in one call:
+
+- LookupTablePolicy looks the state up in a sorted table of hashed states,
+  memory-mapped from a .npy file compiled from an export;
+- MLPPolicy runs a small two-layer network in NumPy, trained on an export
+  to copy the asks of the seats that went on to win.
+
+MicroBatcher wraps a policy so that concurrent requests from different
+games are scored together:
+
+    python policy.py table data table.npy
+    python policy.py mlp data mlp.npz --epochs 3
+    GOFISH_POLICY=table.npy python app.py
+"""
+import argparse
+import queue
+import threading
+import time
+
+import numpy as np
+
+from export import STATE_COLUMNS, decision_state, read_chunks
+from game import VALUES, GoFishGame
+from metrics import metrics
+
+# State columns a policy reads, and how many values each one has
+FEATURES = {
+    'counts': len(VALUES),
+    'probabilities': len(VALUES),
+    'opponent_low': len(VALUES),
+    'opponent_high': len(VALUES),
+    'asked': len(VALUES),
+    'opponent_asks': len(VALUES),
+    'deck_size': 1,
+    'hand_size': 1,
+    'opponent_hand_size': 1,
+    'books': 1,
+    'opponent_books': 1,
+}
+FEATURE_COUNT = sum(FEATURES.values())
+
+
+def _feature_slices():
+    slices = {}
+    start = 0
+    for name, width in FEATURES.items():
+        slices[name] = slice(start, start + width)
+        start += width
+    return slices
+
+
+FEATURE_SLICES = _feature_slices()  # Where each feature sits in a row
+
+MIN_ROWS = 5  # Rows a state and ask need in an export to make it into a table
+MERGE_ROWS = 1 << 20  # Rows gathered before they are merged into a table's counts
+# Fixed odd multipliers hashing a state's small integers into 64 bits
+HASH_MULTIPLIERS = np.random.default_rng(0x60F15).integers(
+    1, 2 ** 63, size=len(VALUES) + 1, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+ASK_BITS = np.uint64(0xF)  # Low bits of a table entry holding the ask's place among the ranks
+BATCH_WINDOW = 0.002  # Seconds a batch waits for more requests
+MAX_BATCH = 64
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def feature_matrix(columns):
+    """Feature rows as float32, from a dict of state columns such as an export chunk"""
+    rows = len(columns['counts'])
+    return np.hstack([
+        np.asarray(columns[name], dtype=np.float32).reshape(rows, width)
+        for name, width in FEATURES.items()
+    ])
+
+
+def encode(game):
+    """Feature row of the state the AI playing ``game`` is in, or None if policies cannot play it"""
+    # Exports, and so policies, cover two players with one deck
+    if len(game.players) != 2 or game.decks != 1:
+        return None
+    state = dict(zip(STATE_COLUMNS, decision_state(game)))
+    row = []
+    for name, width in FEATURES.items():
+        if width == 1:
+            row.append(state[name])
+        else:
+            row.extend(state[name])
+    return np.array(row, dtype=np.float32)
+
+
+def rank_codes(rows):
+    """What a lookup table tells apart about each rank: the cards held and the bounds on the opponent's"""
+    return (rows[:, FEATURE_SLICES['counts']] * 16
+            + np.minimum(rows[:, FEATURE_SLICES['opponent_low']], 3) * 4
+            + np.minimum(rows[:, FEATURE_SLICES['opponent_high']], 3)).astype(np.int64)
+
+
+def state_keys(rows):
+    """Hash of each state with the ask bits clear, and the order of its ranks.
+
+    Ranks are put in order of their codes first, so that states differing
+    only in which ranks are which share a key; tables store the position of
+    the ask in that order rather than the rank itself.
+    """
+    codes = rank_codes(rows)
+    order = np.argsort(codes, axis=1, kind='stable')
+    parts = np.hstack([
+        np.take_along_axis(codes, order, axis=1),
+        rows[:, FEATURE_SLICES['deck_size']] == 0,
+    ]).astype(np.uint64)
+    # Sums of uint64 wrap around, which is what the hash wants
+    keys = (parts * HASH_MULTIPLIERS).sum(axis=1, dtype=np.uint64)
+    keys ^= keys >> np.uint64(29)
+    return keys & ~ASK_BITS, order
+
+
+class Policy:
+    """Picks asks from the feature rows of many games at once.
+
+    Subclasses define ``predict(rows)``, which takes a float32 array of
+    feature rows (see feature_matrix) and returns the rank to ask for in
+    every row, or -1 where the game's own strategies should decide.
+    MicroBatcher only needs ``predict``.
+    """
+
+    def __call__(self, game):
+        row = encode(game)
+        if row is None:
+            return None
+        return value_of(self.predict(row[None])[0])
+
+
+def value_of(rank):
+    return VALUES[rank] if rank >= 0 else None
+
+
+class LookupTablePolicy(Policy):
+    """Ask stored for the game's state in a table compiled by compile_table.
+
+    The table is one sorted array of state keys with the place of the ask in
+    their low bits, memory-mapped so that servers sharing it share its pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.table = np.load(path, mmap_mode='r')
+
+    def __len__(self):
+        return len(self.table)
+
+    def predict(self, rows):
+        keys, order = state_keys(rows)
+        if not len(self.table):
+            return np.full(len(keys), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.table, keys), len(self.table) - 1)
+        entries = self.table[found]
+        hit = (entries & ~ASK_BITS) == keys
+        places = (entries & ASK_BITS).astype(np.int64)
+        ranks = np.take_along_axis(order, places[:, None], axis=1)[:, 0]
+        return np.where(hit, ranks, -1)
+
+
+class MLPPolicy(Policy):
+    """Two-layer network scoring every rank; the best scored rank in hand is asked for"""
+    arrays = ('mean', 'scale', 'w1', 'b1', 'w2', 'b2')
+
+    def __init__(self, path=None, **weights):
+        if path is not None:
+            with np.load(path) as data:
+                weights = {name: data[name] for name in self.arrays}
+        for name in self.arrays:
+            setattr(self, name, np.asarray(weights[name], dtype=np.float32))
+
+    def save(self, path):
+        np.savez(path, **{name: getattr(self, name) for name in self.arrays})
+
+    def scores(self, rows):
+        hidden = np.maximum(((rows - self.mean) * self.scale) @ self.w1 + self.b1, 0)
+        return hidden @ self.w2 + self.b2
+
+    def predict(self, rows):
+        held = rows[:, FEATURE_SLICES['counts']] > 0
+        scores = np.where(held, self.scores(rows), -np.inf)
+        return np.where(held.any(axis=1), scores.argmax(axis=1), -1)
+
+
+def load_policy(path):
+    """MLPPolicy for a .npz file, LookupTablePolicy otherwise"""
+    return MLPPolicy(path) if path.endswith('.npz') else LookupTablePolicy(path)
+
+
+def install_policy(policy):
+    """Ask ``policy`` first on every AI turn of every game"""
+    GoFishGame.policy = policy
+    return policy
+
+
+class _Request:
+    __slots__ = ('row', 'rank', 'error', 'done')
+
+    def __init__(self, row):
+        self.row = row
+        self.rank = -1
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Policy wrapper that scores concurrent requests in one call.
+
+    The caller's thread encodes its game and waits. A background thread
+    takes the first waiting row and gathers more for up to ``window``
+    seconds, but only while other callers are still on their way, so a lone
+    request is scored at once. Then it runs the policy on all of them.
+    """
+
+    def __init__(self, policy, window=BATCH_WINDOW, max_batch=MAX_BATCH, registry=metrics):
+        self.policy = policy
+        self.window = window
+        self.max_batch = max_batch
+        self.batch_sizes = registry.histogram(
+            'gofish_policy_batch_size', 'Games scored per policy call', buckets=BATCH_BUCKETS)
+        self._queue = queue.Queue()
+        self._callers = 0  # Callers between entering __call__ and queueing their row
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __call__(self, game):
+        with self._lock:
+            self._callers += 1
+            if self._thread is None:
+                # Started on first use, so it is not lost when a server forks its workers
+                self._thread = threading.Thread(target=self._run, name='policy-batcher', daemon=True)
+                self._thread.start()
+        try:
+            row = encode(game)
+        finally:
+            with self._lock:
+                self._callers -= 1
+        if row is None:
+            return None
+        request = _Request(row)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return value_of(request.rank)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.monotonic()
+                if not self._callers or remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.batch_sizes.observe(len(batch))
+            try:
+                ranks = self.policy.predict(np.stack([request.row for request in batch]))
+                for request, rank in zip(batch, ranks):
+                    request.rank = int(rank)
+            except Exception as error:
+                for request in batch:
+                    request.error = error
+            for request in batch:
+                request.done.set()
+
+
+def _merge(packed, counts, sums, pending):
+    """Add the (entries, outcomes) pairs in ``pending`` to the counts and outcome sums of each entry"""
+    entries, inverse = np.unique(
+        np.concatenate([packed] + [entries for entries, outcomes in pending]), return_inverse=True)
+    weights = np.concatenate([counts] + [np.ones(len(entries), dtype=np.int64) for entries, outcomes in pending])
+    outcomes = np.concatenate([sums] + [outcomes for entries, outcomes in pending])
+    return (entries,
+            np.bincount(inverse, weights=weights).astype(np.int64),
+            np.bincount(inverse, weights=outcomes).astype(np.int64))
+
+
+def compile_table(directory, path, min_rows=MIN_ROWS):
+    """Compile an export into a lookup table saved at ``path``.
+
+    For every state seen with an ask at least ``min_rows`` times, the table
+    keeps the ask after which the seat did best on average. Returns the
+    number of states.
+    """
+    packed = np.zeros(0, dtype=np.uint64)
+    counts = np.zeros(0, dtype=np.int64)
+    sums = np.zeros(0, dtype=np.int64)
+    pending = []
+    pending_rows = 0
+    columns = tuple(FEATURES) + ('ask', 'outcome')
+    for chunk in read_chunks(directory, columns):
+        rows = feature_matrix(chunk)
+        keys, order = state_keys(rows)
+        # Place of the ask among the ranks, the first of those it is interchangeable with
+        codes = rank_codes(rows)
+        asks = np.asarray(chunk['ask'], dtype=np.int64)
+        asked = codes[np.arange(len(asks)), asks]
+        places = (np.take_along_axis(codes, order, axis=1) == asked[:, None]).argmax(axis=1)
+        pending.append((keys | places.astype(np.uint64),
+                        np.asarray(chunk['outcome'], dtype=np.int64)))
+        pending_rows += len(rows)
+        # Merge once the new rows outnumber the merged ones, so merging stays linear overall
+        if pending_rows >= max(len(packed), MERGE_ROWS):
+            packed, counts, sums = _merge(packed, counts, sums, pending)
+            pending = []
+            pending_rows = 0
+    if pending:
+        packed, counts, sums = _merge(packed, counts, sums, pending)
+
+    keep = counts >= min_rows
+    packed, means = packed[keep], sums[keep] / counts[keep]
+    keys = packed & ~ASK_BITS
+    # Sorted by state, then by mean outcome: the last entry of each state is its best ask
+    order = np.lexsort((means, keys))
+    packed, keys = packed[order], keys[order]
+    last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.zeros(0, dtype=bool)
+    table = packed[last]
+    np.save(path, table)
+    return len(table)
+
+
+def train_mlp(directory, path, hidden=64, epochs=2, batch_size=512, learning_rate=0.001,
+              seed=0, winners_only=True, log=print):
+    """Train an MLPPolicy on an export to copy its asks, and save it at ``path``.
+
+    Only asks for ranks in hand are learned from, and with ``winners_only``
+    only those of seats that went on to win. Returns the policy.
+    """
+    rng = np.random.default_rng(seed)
+    columns = tuple(FEATURES) + ('ask', 'outcome')
+
+    # Standardize the inputs with their mean and spread over the export
+    total = np.zeros(FEATURE_COUNT)
+    squares = np.zeros(FEATURE_COUNT)
+    rows_seen = 0
+    for chunk in read_chunks(directory, columns):
+        rows = feature_matrix(chunk).astype(np.float64)
+        total += rows.sum(axis=0)
+        squares += (rows ** 2).sum(axis=0)
+        rows_seen += len(rows)
+    mean = total / max(rows_seen, 1)
+    spread = np.sqrt(np.maximum(squares / max(rows_seen, 1) - mean ** 2, 0))
+    policy = MLPPolicy(
+        mean=mean,
+        scale=np.where(spread > 0, 1 / np.where(spread > 0, spread, 1), 0),
+        w1=rng.normal(0, np.sqrt(2 / FEATURE_COUNT), (FEATURE_COUNT, hidden)),
+        b1=np.zeros(hidden),
+        w2=rng.normal(0, np.sqrt(2 / hidden), (hidden, len(VALUES))),
+        b2=np.zeros(len(VALUES)),
+    )
+
+    # Adam on the cross-entropy of the ask among the ranks in hand
+    parameters = ('w1', 'b1', 'w2', 'b2')
+    moments = {name: np.zeros_like(getattr(policy, name)) for name in parameters}
+    velocities = {name: np.zeros_like(getattr(policy, name)) for name in parameters}
+    step = 0
+    for epoch in range(epochs):
+        loss = correct = seen = 0
+        for chunk in read_chunks(directory, columns):
+            rows = feature_matrix(chunk)
+            asks = np.asarray(chunk['ask'], dtype=np.int64)
+            held = rows[:, FEATURE_SLICES['counts']] > 0
+            keep = held[np.arange(len(asks)), asks]
+            if winners_only:
+                keep &= np.asarray(chunk['outcome']) == 1
+            rows, asks, held = rows[keep], asks[keep], held[keep]
+            for batch in np.array_split(rng.permutation(len(rows)), max(1, len(rows) // batch_size)):
+                if not len(batch):
+                    continue
+                inputs = (rows[batch] - policy.mean) * policy.scale
+                hidden_in = inputs @ policy.w1 + policy.b1
+                hidden_out = np.maximum(hidden_in, 0)
+                scores = np.where(held[batch], hidden_out @ policy.w2 + policy.b2, -np.inf)
+                scores -= scores.max(axis=1, keepdims=True)
+                odds = np.exp(scores)
+                odds /= odds.sum(axis=1, keepdims=True)
+                targets = asks[batch]
+                picked = odds[np.arange(len(batch)), targets]
+                loss += -np.log(np.maximum(picked, 1e-12)).sum()
+                correct += (odds.argmax(axis=1) == targets).sum()
+                seen += len(batch)
+
+                delta = odds
+                delta[np.arange(len(batch)), targets] -= 1
+                delta /= len(batch)
+                gradients = {'w2': hidden_out.T @ delta, 'b2': delta.sum(axis=0)}
+                back = (delta @ policy.w2.T) * (hidden_in > 0)
+                gradients['w1'] = inputs.T @ back
+                gradients['b1'] = back.sum(axis=0)
+                step += 1
+                for name in parameters:
+                    moments[name] = 0.9 * moments[name] + 0.1 * gradients[name]
+                    velocities[name] = 0.999 * velocities[name] + 0.001 * gradients[name] ** 2
+                    update = (moments[name] / (1 - 0.9 ** step)) / (
+                        np.sqrt(velocities[name] / (1 - 0.999 ** step)) + 1e-8)
+                    setattr(policy, name, (getattr(policy, name) - learning_rate * update).astype(np.float32))
+        if log is not None and seen:
+            log(f"Epoch {epoch + 1}: loss {loss / seen:.4f}, matches the export on {correct / seen:.1%} of {seen:,} asks")
+    policy.save(path)
+    return policy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    table = commands.add_parser('table', help="compile an export into a lookup table")
+    table.add_argument('export', help="directory written by export.py")
+    table.add_argument('out', help=".npy file for the table")
+    table.add_argument('--min-rows', type=int, default=MIN_ROWS)
+    mlp = commands.add_parser('mlp', help="train a small network on an export")
+    mlp.add_argument('export', help="directory written by export.py")
+    mlp.add_argument('out', help=".npz file for the weights")
+    mlp.add_argument('--hidden', type=int, default=64)
+    mlp.add_argument('--epochs', type=int, default=2)
+    mlp.add_argument('--batch-size', type=int, default=512)
+    mlp.add_argument('--learning-rate', type=float, default=0.001)
+    mlp.add_argument('--seed', type=int, default=0)
+    mlp.add_argument('--all-seats', action='store_true', help="learn from the losers' asks too")
+    args = parser.parse_args(argv)
+
+    if args.command == 'table':
+        states = compile_table(args.export, args.out, args.min_rows)
+        print(f"Wrote {states:,} states to {args.out}")
+    else:
+        train_mlp(args.export, args.out, args.hidden, args.epochs, args.batch_size,
+                  args.learning_rate, args.seed, not args.all_seats)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Opt-in sampling profiler that writes flame-graph-ready stacks.
+
+A background thread looks at the stack of every other thread a few hundred
+times a second and counts each distinct stack. ``dump`` writes the counts in
+the folded format ("outer;inner;leaf count" per line) read by flamegraph.pl,
+speedscope and inferno. Nothing runs until ``start`` is called.
+"""
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+INTERVAL = 0.005  # Seconds between samples
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            samples = []
+            for thread_id, frame in frames.items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                samples.append(';'.join(reversed(stack)))
+            with self._lock:
+                self.stacks.update(samples)
+
+    def folded(self):
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+    def dump(self, path):
+        """Write the folded stacks to ``path``"""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as file:
+            file.write(self.folded())
+        os.replace(file.name, path)
+
+    def clear(self):
+        with self._lock:
+            self.stacks.clear()
@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class _Entry:
+    __slots__ = ('game', 'lock', 'last_used')
+
+    def __init__(self, game, now):
+        self.game = game
+        self.lock = threading.Lock()
+        self.last_used = now
+
+
+class GameRegistry:
+    """Store of active games keyed by game ID.
+
+    Each game gets its own lock so concurrent requests for different games
+    never wait on each other. Games idle for longer than ``ttl`` seconds are
+    evicted, and once ``max_games`` are stored the least recently used game
+    makes room for a new one.
+
+    With a ``store`` (a movelog.MoveLog) every game is seeded and its moves
+    are logged, so a game evicted here or created by another process is
+    rebuilt from the log on its next checkout, and moves logged elsewhere are
+    replayed before the caller sees the game.
+    """
+
+    def __init__(self, factory, max_games=10000, ttl=60 * 60, clock=time.monotonic, store=None):
+        self.factory = factory
+        self.store = store
+        self.max_games = max_games
+        self.ttl = ttl
+        self.clock = clock
+        # Least recently used games first, so eviction only looks at the front
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, game_id):
+        if game_id in self._entries:
+            return True
+        return self.store is not None and game_id in self.store
+
+    def create(self, *args, **kwargs):
+        """Start a new game and return its ID along with the game"""
+        game_id = uuid.uuid4().hex
+        if self.store is not None:
+            # The seed is all the log needs to deal the same cards again
+            seed = random.getrandbits(63)
+            game = self.factory(*args, rng=random.Random(seed), **kwargs)
+            self.store.create(game_id, seed, kwargs)
+        else:
+            game = self.factory(*args, **kwargs)
+        self._add(game_id, game, self.clock())
+        return game_id, game
+
+    def _add(self, game_id, game, now):
+        with self._lock:
+            self._evict_expired(now)
+            while len(self._entries) >= self.max_games:
+                self._entries.popitem(last=False)
+            return self._entries.setdefault(game_id, _Entry(game, now))
+
+    @contextmanager
+    def checkout(self, game_id):
+        """Hold the lock of a game while the caller works on it.
+
+        Yields ``None`` if the game does not exist or has expired, or if
+        ``game_id`` is not a string, as IDs from a request body may not be.
+        """
+        if not isinstance(game_id, str):
+            yield None
+            return
+        now = self.clock()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(game_id)
+            if entry is not None:
+                entry.last_used = now
+                self._entries.move_to_end(game_id)
+        if entry is None and self.store is not None:
+            game = self.store.load(game_id, self.factory)
+            if game is not None:
+                entry = self._add(game_id, game, now)
+        if entry is None:
+            yield None
+            return
+        with entry.lock:
+            if self.store is None:
+                yield entry.game
+                return
+            yield from self._logged(game_id, entry.game)
+
+    def _logged(self, game_id, game):
+        # Catch up with moves logged elsewhere, then log the caller's moves
+        self.store.catch_up(game_id, game)
+        start = game.move_count
+        moves = []
+        game.on_move = moves.append
+        try:
+            yield game
+            game.on_move = None
+            self.store.append(game_id, start, moves, game)
+        except BaseException:
+            # This copy may have diverged from the log; rebuild it next time
+            game.on_move = None
+            self.remove(game_id)
+            raise
+
+    def remove(self, game_id):
+        with self._lock:
+            self._entries.pop(game_id, None)
+
+    def _evict_expired(self, now):
+        # Entries are ordered by last use, so stop at the first live one
+        while self._entries:
+            game_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_used <= self.ttl:
+                break
+            del self._entries[game_id]
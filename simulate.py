@@ -0,0 +1,241 @@
+"""Headless self-play for tuning the AI.
+
+Plays games between two strategies without the Flask server and reports win
+rates, books and game lengths. Games are sharded across a process pool and
+every game is seeded from the run seed and its index, so a run can be
+reproduced exactly.
+
+    python simulate.py --games 100000 --seats heuristic random
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import time
+from collections import Counter
+from functools import partial
+
+import numpy as np
+
+from decision_cache import install_decision_cache
+from engines import ENGINES
+
+MAX_TURNS = 1000  # Games still running after this many turns are abandoned
+SHARD_SIZE = 1000  # Games played per pool task
+
+
+def heuristic_strategy(game, rng):
+    """The AI's own strategy pipeline"""
+    return game._get_best_card_to_ask()
+
+
+def random_strategy(game, rng):
+    """Ask for the value of a random card in hand"""
+    return rng.choice(list(game.players[game.ai_player])).value
+
+
+def greedy_strategy(game, rng):
+    """Ask for the value held most often, lowest value on ties"""
+    values_count = {}
+    for card in game.players[game.ai_player]:
+        values_count[card.value] = values_count.get(card.value, 0) + 1
+    return max(values_count, key=values_count.get)
+
+
+def montecarlo_strategy(game, rng):
+    """Determinized rollouts, a fixed number per move so runs stay reproducible"""
+    from montecarlo import MonteCarloAI
+    global _montecarlo_ai
+    if _montecarlo_ai is None:
+        _montecarlo_ai = MonteCarloAI(budget=None)
+    return _montecarlo_ai(game, np.random.default_rng(rng.getrandbits(64)))
+
+
+_montecarlo_ai = None
+
+STRATEGIES = {
+    'heuristic': heuristic_strategy,
+    'random': random_strategy,
+    'greedy': greedy_strategy,
+    'montecarlo': montecarlo_strategy,
+}
+
+
+class SimulationStats:
+    """Aggregated results of a batch of games"""
+
+    def __init__(self):
+        self.games = 0
+        self.wins = [0, 0]
+        self.ties = 0
+        self.abandoned = 0
+        self.books = [Counter(), Counter()]  # Books per game for each seat
+        self.lengths = Counter()  # Turns per game
+
+    def add_game(self, game, turns, finished):
+        self.games += 1
+        self.lengths[turns] += 1
+        self.books[0][game.books[0]] += 1
+        self.books[1][game.books[1]] += 1
+        if not finished:
+            self.abandoned += 1
+            return
+        winner = game.get_winner()
+        if winner is None:
+            self.ties += 1
+        else:
+            self.wins[winner] += 1
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins[0] += other.wins[0]
+        self.wins[1] += other.wins[1]
+        self.ties += other.ties
+        self.abandoned += other.abandoned
+        self.books[0].update(other.books[0])
+        self.books[1].update(other.books[1])
+        self.lengths.update(other.lengths)
+        return self
+
+    def to_dict(self):
+        return {
+            'games': self.games,
+            'wins': self.wins,
+            'ties': self.ties,
+            'abandoned': self.abandoned,
+            'books': [dict(sorted(counts.items())) for counts in self.books],
+            'lengths': dict(sorted(self.lengths.items())),
+        }
+
+
+def game_seed(seed, index):
+    """Seed of one game in a run"""
+    return seed * 2 ** 32 + index
+
+
+def play_game(engine, strategies, rng):
+    """Play one game to the end; return the game, its turns and whether it finished"""
+    game = engine(rng=rng)
+    # Both seats need a memory from the first ask on
+    game.set_ai_player(0)
+    game.set_ai_player(1)
+    choosers = [partial(strategy, rng=rng) for strategy in strategies]
+    turns = 0
+    while not game.is_game_over():
+        if turns == MAX_TURNS:
+            return game, turns, False
+        seat = game.current_player
+        game.set_ai_player(seat)
+        game.ai_make_move(choosers[seat])
+        turns += 1
+    return game, turns, True
+
+
+def run_shard(engine_name, strategy_names, seed, start, stop, vectorized=False):
+    if vectorized:
+        from batch import run_batch
+        return run_batch(strategy_names, seed, start, stop)
+    engine = ENGINES[engine_name]
+    strategies = [STRATEGIES[name] for name in strategy_names]
+    stats = SimulationStats()
+    for index in range(start, stop):
+        game, turns, finished = play_game(engine, strategies, random.Random(game_seed(seed, index)))
+        stats.add_game(game, turns, finished)
+    return stats
+
+
+def _run_shard(task):
+    return run_shard(*task)
+
+
+def _init_worker(decision_cache, decision_cache_file):
+    if decision_cache:
+        install_decision_cache(decision_cache, decision_cache_file)
+
+
+def simulate(games, strategies=('heuristic', 'heuristic'), engine='compact', seed=0,
+             processes=None, shard_size=SHARD_SIZE, vectorized=False,
+             decision_cache=0, decision_cache_file=None):
+    """Play ``games`` games and return their SimulationStats.
+
+    ``strategies`` names the strategy of seat 0 and seat 1. ``processes``
+    defaults to one worker per CPU; with 1 the games run in this process.
+    ``vectorized`` plays each shard in lockstep with the NumPy batch engine.
+    ``decision_cache`` gives every worker a DecisionCache of that size,
+    warmed from ``decision_cache_file``; only a single-process run writes
+    the cache back to the file.
+    """
+    tasks = [
+        (engine, tuple(strategies), seed, start, min(start + shard_size, games), vectorized)
+        for start in range(0, games, shard_size)
+    ]
+    stats = SimulationStats()
+    if processes == 1:
+        cache = install_decision_cache(decision_cache, decision_cache_file) if decision_cache else None
+        for task in tasks:
+            stats.merge(_run_shard(task))
+        if cache is not None and decision_cache_file:
+            cache.save(decision_cache_file)
+        return stats
+    initargs = (decision_cache, decision_cache_file)
+    with multiprocessing.Pool(processes, _init_worker, initargs) as pool:
+        for shard_stats in pool.imap_unordered(_run_shard, tasks):
+            stats.merge(shard_stats)
+    return stats
+
+
+def format_report(stats, elapsed):
+    lines = [f"Games: {stats.games} in {elapsed:.2f}s ({stats.games / elapsed * 60:,.0f} games/min)"]
+    for seat in (0, 1):
+        lines.append(f"Seat {seat} wins: {stats.wins[seat]} ({stats.wins[seat] / stats.games:.1%})")
+    lines.append(f"Ties: {stats.ties}  Abandoned: {stats.abandoned}")
+    for seat in (0, 1):
+        books = stats.books[seat]
+        mean = sum(count * games for count, games in books.items()) / stats.games
+        spread = ' '.join(f"{count}:{games}" for count, games in sorted(books.items()))
+        lines.append(f"Seat {seat} books: mean {mean:.2f}  [{spread}]")
+    lines.append("Game length (turns):")
+    buckets = Counter()
+    for turns, games in stats.lengths.items():
+        buckets[turns // 10 * 10] += games
+    for start, games in sorted(buckets.items()):
+        lines.append(f"  {start:4d}-{start + 9:<4d} {games}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--seats', nargs=2, default=['heuristic', 'heuristic'],
+                        choices=sorted(STRATEGIES), metavar='STRATEGY',
+                        help=f"strategies of seat 0 and seat 1 ({', '.join(sorted(STRATEGIES))})")
+    parser.add_argument('--engine', default='compact', choices=sorted(ENGINES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE)
+    parser.add_argument('--vectorized', action='store_true',
+                        help="play each shard with the NumPy batch engine (greedy and random only)")
+    parser.add_argument('--decision-cache', type=int, default=0, metavar='SIZE',
+                        help="cache up to SIZE AI decisions per worker")
+    parser.add_argument('--decision-cache-file', metavar='PATH',
+                        help="warm the decision cache from PATH (saved back with --processes 1)")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args(argv)
+    if args.vectorized:
+        from batch import BATCH_STRATEGIES
+        if not set(args.seats) <= set(BATCH_STRATEGIES):
+            parser.error(f"--vectorized supports {', '.join(BATCH_STRATEGIES)} only")
+
+    started = time.perf_counter()
+    stats = simulate(args.games, args.seats, args.engine, args.seed, args.processes, args.shard_size,
+                     args.vectorized, args.decision_cache, args.decision_cache_file)
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps(stats.to_dict()))
+    else:
+        print(format_report(stats, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""The batch engine must play exactly the games the per-game engines play."""
+import pytest
+
+from batch import compare_with_engine
+
+
+@pytest.mark.parametrize('engine', ['compact', 'classic'])
+@pytest.mark.parametrize('seed', [0, 7])
+def test_batch_engine_plays_the_same_games(engine, seed):
+    assert compare_with_engine(200, seed=seed, engine=engine) == []
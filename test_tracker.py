@@ -0,0 +1,50 @@
+"""The AI's bounds on its opponents' hands must hold in every position of a game."""
+import random
+
+import pytest
+
+from engines import ENGINES
+
+
+def play_checking_bounds(engine, seed, seats=2, decks=1, humans=()):
+    """Play a game, people asking for random values in their hand; return the bounds that failed"""
+    rng = random.Random(seed)
+    game = engine(rng=rng, seats=seats, decks=decks,
+                  ai_seats=[seat for seat in range(seats) if seat not in humans])
+    failures = []
+    for _ in range(2000):
+        if game.is_game_over():
+            break
+        player = game.current_player
+        if player in game.ai_memories:
+            game.set_ai_player(player)
+            game.ai_make_move()
+        elif game.players[player]:
+            to_player = rng.choice([seat for seat in range(seats) if seat != player])
+            game.take_turn(player, to_player, rng.choice(list(game.players[player])).value)
+        else:
+            game.draw_or_pass(player)
+        for seat, memory in game.ai_memories.items():
+            for opponent in range(seats):
+                if opponent == seat:
+                    continue
+                for value in game.values:
+                    unseen = 4 * (decks - game.booked_counts[value]) - game.value_counts[seat][value]
+                    low, high = memory['opponents'].bounds(opponent, value, unseen)
+                    if not low <= game.value_counts[opponent][value] <= high:
+                        failures.append((seat, opponent, value))
+    assert game.is_game_over()
+    return failures
+
+
+@pytest.mark.parametrize('engine', sorted(ENGINES))
+@pytest.mark.parametrize('humans', [(), (0,)])
+def test_bounds_hold_at_two_seats(engine, humans):
+    for seed in range(20):
+        assert play_checking_bounds(ENGINES[engine], seed, humans=humans) == []
+
+
+@pytest.mark.parametrize('seats, decks', [(3, 1), (4, 2), (6, 3), (8, 1)])
+def test_bounds_hold_at_larger_tables(seats, decks):
+    for seed in range(5):
+        assert play_checking_bounds(ENGINES['classic'], seed, seats, decks, humans=(0,)) == []
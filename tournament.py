@@ -0,0 +1,379 @@
+"""Tournaments that rank AI variants against each other.
+
+A player is one of the strategies of simulate.py, optionally with its own
+values for the heuristic AI's weights. Players meet in round-robin or Swiss
+rounds, and every pairing plays the same deals twice with the seats swapped,
+so neither side is luckier with the cards. Blocks of games run on a process
+pool and each finished block is appended to a CSV file right away; that
+file is also the checkpoint, so an interrupted tournament carries on where
+it stopped when run again with the same arguments. Elo ratings with 95%
+confidence intervals are fitted to every game played and reported as the
+tournament goes.
+
+    python tournament.py --players heuristic greedy random --deals 1000 --results rr.csv
+    python tournament.py --config players.json --pairing swiss --rounds 6 --results swiss.csv
+
+where players.json lists the players, for example:
+
+    [{"name": "baseline"},
+     {"name": "eager", "params": {"high_probability_threshold": 0.2}},
+     {"name": "greedy", "strategy": "greedy"}]
+"""
+import argparse
+import csv
+import json
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from functools import partial
+
+import numpy as np
+
+from engines import ENGINES
+from simulate import STRATEGIES, game_seed, play_game
+
+DEALS = 500  # Deals per pairing and round, each played from both seats
+BLOCK_SIZE = 25  # Deals per pool task
+REPORT_EVERY = 30  # Seconds between standings while the tournament runs
+PRIOR_DRAWS = 1  # Virtual drawn games between players who met, so ratings stay finite
+ELO_SCALE = 400 / math.log(10)  # Elo points per unit of log strength
+Z_95 = 1.96
+# GoFishGame weights a player can set
+TUNABLES = (
+    'high_probability_threshold',
+    'behavior_probability_threshold',
+    'late_game_score_bonus',
+    'success_rate_weight',
+)
+FIELDS = ('round', 'deal', 'seat0', 'seat1', 'winner', 'books0', 'books1', 'turns', 'finished')
+
+
+def load_players(config=None, strategies=()):
+    """Players from a JSON config file followed by plain strategy names"""
+    players = []
+    if config:
+        with open(config) as file:
+            players.extend(json.load(file))
+    players.extend({'strategy': name} for name in strategies)
+    names = set()
+    for player in players:
+        player.setdefault('strategy', 'heuristic')
+        player.setdefault('name', player['strategy'])
+        player.setdefault('params', {})
+        if player['strategy'] not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {player['strategy']!r}")
+        unknown = set(player['params']) - set(TUNABLES)
+        if unknown:
+            raise ValueError(f"Unknown parameters for {player['name']}: {', '.join(sorted(unknown))}")
+        if player['name'] in names:
+            raise ValueError(f"Two players are named {player['name']!r}")
+        names.add(player['name'])
+    if len(players) < 2:
+        raise ValueError("A tournament needs at least two players")
+    return players
+
+
+def tuned_strategy(game, rng, strategy, params):
+    """Run ``strategy`` with the player's own weights"""
+    # Instance attributes shadow the class defaults for this move only
+    vars(game).update(params)
+    try:
+        return strategy(game, rng)
+    finally:
+        for name in params:
+            delattr(game, name)
+
+
+def make_strategy(player):
+    strategy = STRATEGIES[player['strategy']]
+    if not player['params']:
+        return strategy
+    return partial(tuned_strategy, strategy=strategy, params=player['params'])
+
+
+def play_block(task):
+    """Play a block of games; return them as rows of the results file"""
+    engine_name, seed, number, games = task
+    engine = ENGINES[engine_name]
+    rows = []
+    for deal, first, second in games:
+        # The deal's seed shuffles the same deck whoever sits where
+        game, turns, finished = play_game(
+            engine, [make_strategy(first), make_strategy(second)], random.Random(game_seed(seed, deal)))
+        rows.append({
+            'round': number,
+            'deal': deal,
+            'seat0': first['name'],
+            'seat1': second['name'],
+            'winner': game.get_winner() if finished else None,
+            'books0': game.books[0],
+            'books1': game.books[1],
+            'turns': turns,
+            'finished': int(finished),
+        })
+    return rows
+
+
+def read_results(path):
+    """Rows of a results file, dropping a last row cut short by an interruption"""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb+') as file:
+        data = file.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            file.truncate(end)
+    rows = []
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            for field in ('round', 'deal', 'books0', 'books1', 'turns', 'finished'):
+                row[field] = int(row[field])
+            row['winner'] = int(row['winner']) if row['winner'] else None
+            rows.append(row)
+    return rows
+
+
+class Standings:
+    """Points scored between every pair of players, and the Elo ratings they give"""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.index = {name: index for index, name in enumerate(self.names)}
+        self.games = np.zeros((len(names), len(names)))
+        self.scores = np.zeros((len(names), len(names)))  # Points of the row player against the column one
+
+    def add(self, row):
+        first = self.index.get(row['seat0'])
+        second = self.index.get(row['seat1'])
+        if first is None or second is None:
+            # A player since dropped from the tournament
+            return
+        # Ties and abandoned games count as draws
+        score = 0.5 if row['winner'] is None else float(row['winner'] == 0)
+        self.games[first, second] += 1
+        self.games[second, first] += 1
+        self.scores[first, second] += score
+        self.scores[second, first] += 1 - score
+
+    def ratings(self):
+        """Elo ratings averaging 0, and the half-widths of their 95% confidence intervals.
+
+        Ratings are the Bradley-Terry maximum likelihood fit, found with
+        Hunter's MM iterations; the intervals come from the inverse of the
+        Fisher information.
+        """
+        met = self.games > 0
+        games = self.games + PRIOR_DRAWS * met
+        wins = (self.scores + PRIOR_DRAWS / 2 * met).sum(axis=1)
+        played = games.sum(axis=1) > 0
+        strength = np.ones(len(self.names))
+        for _ in range(10000):
+            totals = (games / (strength[:, None] + strength[None, :])).sum(axis=1)
+            updated = np.where(played, wins / np.where(played, totals, 1), 1)
+            updated /= np.exp(np.log(updated).mean())
+            converged = np.abs(np.log(updated / strength)).max() < 1e-10
+            strength = updated
+            if converged:
+                break
+        logs = np.log(strength)
+        expected = 1 / (1 + np.exp(logs[None, :] - logs[:, None]))
+        weights = games * expected * (1 - expected)
+        information = np.diag(weights.sum(axis=1)) - weights
+        # Ratings are only known up to a shift, which averaging them to 0 removes
+        variance = np.diag(np.linalg.pinv(information))
+        margins = np.where(played, Z_95 * ELO_SCALE * np.sqrt(np.maximum(variance, 0)), np.inf)
+        return ELO_SCALE * (logs - logs.mean()), margins
+
+    def to_dict(self):
+        elo, margins = self.ratings()
+        played = self.games.sum(axis=1)
+        scored = self.scores.sum(axis=1)
+        return {
+            name: {
+                'elo': round(float(elo[index]), 1),
+                'ci95': round(float(margins[index]), 1),
+                'games': int(played[index]),
+                'score': float(scored[index] / played[index]) if played[index] else None,
+            }
+            for index, name in enumerate(self.names)
+        }
+
+    def report(self):
+        lines = [f"{'player':24s} {'elo':>7s} {'95% ci':>8s} {'games':>8s} {'score':>7s}"]
+        standings = self.to_dict()
+        for name, result in sorted(standings.items(), key=lambda item: -item[1]['elo']):
+            score = f"{result['score']:.1%}" if result['score'] is not None else '-'
+            lines.append(f"{name:24s} {result['elo']:7.0f} {'±' + format(result['ci95'], '.0f'):>8s} "
+                         f"{result['games']:8d} {score:>7s}")
+        return '\n'.join(lines)
+
+
+def round_robin(names):
+    return [(first, second) for index, first in enumerate(names) for second in names[index + 1:]]
+
+
+class SwissPairing:
+    """Pairs players with equal match points who have not met yet"""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.points = dict.fromkeys(names, 0.0)  # 1 per match won, 0.5 per match drawn
+        self.byes = dict.fromkeys(names, 0)
+        self.met = {name: set() for name in names}
+
+    def pair(self, elo):
+        # Ratings break ties between players on the same points
+        order = sorted(self.names, key=lambda name: (-self.points[name], -elo[name]))
+        if len(order) % 2:
+            # The lowest ranked of the players with the fewest byes sits out and wins the round
+            bye = min(reversed(order), key=self.byes.get)
+            order.remove(bye)
+            self.byes[bye] += 1
+            self.points[bye] += 1
+        pairs = []
+        while order:
+            first = order.pop(0)
+            second = next((name for name in order if name not in self.met[first]), order[0])
+            order.remove(second)
+            self.met[first].add(second)
+            self.met[second].add(first)
+            pairs.append((first, second))
+        return pairs
+
+    def score(self, pairs, rows):
+        """Award the match points of a finished round"""
+        totals = defaultdict(float)
+        for row in rows:
+            winner = row['winner']
+            totals[row['seat0']] += 0.5 if winner is None else float(winner == 0)
+            totals[row['seat1']] += 0.5 if winner is None else float(winner == 1)
+        for first, second in pairs:
+            if totals[first] == totals[second]:
+                self.points[first] += 0.5
+                self.points[second] += 0.5
+            else:
+                self.points[first if totals[first] > totals[second] else second] += 1
+
+
+def run_tournament(players, results, deals=DEALS, pairing='round-robin', rounds=None,
+                   engine='compact', seed=0, processes=None, block_size=BLOCK_SIZE,
+                   report_every=REPORT_EVERY, log=sys.stderr):
+    """Play a tournament, appending every game to the CSV file ``results``.
+
+    Games already in the file are not played again. Every round, each
+    pairing plays ``deals`` deals from both seats. ``rounds`` defaults to one
+    round-robin, or enough Swiss rounds to separate the players. Returns the
+    final Standings.
+    """
+    names = [player['name'] for player in players]
+    by_name = {player['name']: player for player in players}
+    if rounds is None:
+        rounds = 1 if pairing == 'round-robin' else max(1, math.ceil(math.log2(len(players))))
+    earlier = defaultdict(list)
+    for row in read_results(results):
+        earlier[row['round']].append(row)
+    done = {(row['round'], row['deal'], row['seat0'], row['seat1'])
+            for rows in earlier.values() for row in rows}
+    standings = Standings(names)
+    swiss = SwissPairing(names)
+
+    new_file = not os.path.exists(results) or os.path.getsize(results) == 0
+    pool = multiprocessing.Pool(processes) if processes != 1 else None
+    try:
+        with open(results, 'a', newline='') as file:
+            writer = csv.DictWriter(file, FIELDS)
+            if new_file:
+                writer.writeheader()
+            reported = time.monotonic()
+            for number in range(rounds):
+                if pairing == 'round-robin':
+                    pairs = round_robin(names)
+                else:
+                    # Pair on the games before this round, as the first run did
+                    elo, _ = standings.ratings()
+                    pairs = swiss.pair(dict(zip(names, elo)))
+                round_rows = [row for row in earlier[number]
+                              if {row['seat0'], row['seat1']} in [set(pair) for pair in pairs]]
+                for row in round_rows:
+                    standings.add(row)
+
+                # Every pairing of a round plays the same deals, and every round new ones
+                games = [
+                    (deal, first, second)
+                    for pair in pairs
+                    for deal in range(number * deals, (number + 1) * deals)
+                    for first, second in (pair, pair[::-1])
+                    if (number, deal, first, second) not in done
+                ]
+                tasks = [
+                    (engine, seed, number,
+                     [(deal, by_name[first], by_name[second])
+                      for deal, first, second in games[start:start + 2 * block_size]])
+                    for start in range(0, len(games), 2 * block_size)
+                ]
+                # Workers take the next block as soon as they are free, so a slow
+                # block never holds up the others
+                blocks = pool.imap_unordered(play_block, tasks) if pool else map(play_block, tasks)
+                for rows in blocks:
+                    writer.writerows(rows)
+                    file.flush()
+                    for row in rows:
+                        standings.add(row)
+                    round_rows.extend(rows)
+                    if log is not None and time.monotonic() - reported >= report_every:
+                        reported = time.monotonic()
+                        print(f"Round {number + 1}/{rounds}\n{standings.report()}\n", file=log)
+                swiss.score(pairs, round_rows)
+                if log is not None:
+                    print(f"After round {number + 1}/{rounds}\n{standings.report()}\n", file=log)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return standings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--players', nargs='*', default=[], choices=sorted(STRATEGIES), metavar='STRATEGY',
+                        help=f"players with a strategy's default settings ({', '.join(sorted(STRATEGIES))})")
+    parser.add_argument('--config', help="JSON file listing players, with optional params "
+                                         f"({', '.join(TUNABLES)})")
+    parser.add_argument('--results', required=True, help="CSV file the games are appended to")
+    parser.add_argument('--pairing', default='round-robin', choices=('round-robin', 'swiss'))
+    parser.add_argument('--rounds', type=int, default=None)
+    parser.add_argument('--deals', type=int, default=DEALS,
+                        help="deals per pairing and round, each played from both seats")
+    parser.add_argument('--engine', default='compact', choices=sorted(ENGINES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--report-every', type=float, default=REPORT_EVERY, metavar='SECONDS')
+    parser.add_argument('--json', action='store_true', help="print the final ratings as JSON")
+    args = parser.parse_args(argv)
+    try:
+        players = load_players(args.config, args.players)
+    except ValueError as error:
+        parser.error(str(error))
+
+    try:
+        standings = run_tournament(players, args.results, args.deals, args.pairing, args.rounds,
+                                   args.engine, args.seed, args.processes, args.block_size,
+                                   args.report_every)
+    except KeyboardInterrupt:
+        print(f"Interrupted; run again with the same arguments to resume from {args.results}",
+              file=sys.stderr)
+        return 130
+    if args.json:
+        print(json.dumps(standings.to_dict()))
+    else:
+        print(standings.report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
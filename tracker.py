@@ -0,0 +1,193 @@
+"""Exact bounds on the cards an opponent holds, and the odds that follow.
+
+A seat sees its own hand, the books and every ask, but not the opponent's
+hand or the deck. From the asks it still learns a lot: an opponent who gives
+cards away or says "go fish" holds none of that value, and where the rules
+only allow asking for values in hand, an opponent who asks holds at least
+one (plus whatever it was given). Only the opponent's draws bring in cards
+the seat cannot see.
+
+Given those bounds, the opponent's hand is the cards it must hold plus a
+uniform sample of the cards that could be on either side, so the chance that
+it holds a value is hypergeometric.
+"""
+
+
+class OpponentTracker:
+    """Lower and upper bounds on the opponent's cards of each value.
+
+    Every event is O(1): a draw by the opponent raises all upper bounds at
+    once through a shared draw counter, and each value remembers the counter
+    at the moment its bound was last known exactly.
+    """
+
+    def __init__(self, values, draws=0):
+        self.low = dict.fromkeys(values, 0)
+        self.high = dict.fromkeys(values, 0)  # Upper bound when it was last reset
+        self.marks = dict.fromkeys(values, 0)  # Draws at that moment
+        self.draws = draws  # Cards the opponent drew unseen
+
+    def drew(self):
+        self.draws += 1
+
+    def asked(self, value, received, holds=True):
+        """The opponent asked for ``value`` and was given ``received`` cards of it.
+
+        ``holds`` says whether the opponent can only ask for values it holds.
+        """
+        held = 1 if holds else 0
+        self.low[value] = max(self.low[value], held) + received
+        self.high[value] = max(self.high[value] + self.draws - self.marks[value], held) + received
+        self.marks[value] = self.draws
+
+    def cleared(self, value):
+        """The opponent holds no cards of ``value`` any more"""
+        self.low[value] = 0
+        self.high[value] = 0
+        self.marks[value] = self.draws
+
+    def booked(self, value):
+        """The opponent laid down a set of ``value``; with several decks it may keep some"""
+        self.low[value] = max(self.low[value] - 4, 0)
+        self.high[value] = max(self.high[value] + self.draws - self.marks[value] - 4, 0)
+        self.marks[value] = self.draws
+
+    def bounds(self, value, unseen):
+        """Least and most cards of ``value`` the opponent can hold.
+
+        ``unseen`` is the number of cards of the value the seat cannot see.
+        """
+        high = min(self.high[value] + self.draws - self.marks[value], unseen)
+        return min(self.low[value], high), high
+
+    def ranges(self, unseen):
+        """Lists of the least and most cards of each value, like bounds() for every value"""
+        draws = self.draws
+        low = self.low
+        high = self.high
+        marks = self.marks
+        lows = []
+        highs = []
+        # Same arithmetic as bounds(), inlined as this runs on every AI move
+        for value, count in unseen.items():
+            top = high[value] + draws - marks[value]
+            if top > count:
+                top = count
+            bottom = low[value]
+            if bottom > top:
+                bottom = top
+            lows.append(bottom)
+            highs.append(top)
+        return lows, highs
+
+    def probabilities(self, unseen, hand_size):
+        """Chance that the opponent holds at least one card of each value.
+
+        ``unseen`` maps every value to the number of its cards the seat
+        cannot see, and ``hand_size`` is the size of the opponent's hand.
+        """
+        lows, highs = self.ranges(unseen)
+        return odds(unseen, lows, highs, hand_size)
+
+    def state(self):
+        """The bounds as plain lists in the order of the values, for from_state()"""
+        return [list(self.low.values()), list(self.high.values()), list(self.marks.values()), self.draws]
+
+    @classmethod
+    def from_state(cls, values, state):
+        low, high, marks, draws = state
+        tracker = cls(values, draws)
+        tracker.low = dict(zip(values, low))
+        tracker.high = dict(zip(values, high))
+        tracker.marks = dict(zip(values, marks))
+        return tracker
+
+
+def odds(values, lows, highs, hand_size):
+    """Chance that a hand of ``hand_size`` cards holds each value, given its ranges()"""
+    bound = sum(lows)
+    free = hand_size - bound  # Cards in the hand beyond the ones it must hold
+    pool = sum(highs) - bound  # Unseen cards that can be in the hand or in the deck
+    free = max(0, min(free, pool))
+
+    probabilities = {}
+    for value, bottom, top in zip(values, lows, highs):
+        if bottom:
+            probabilities[value] = 1.0
+            continue
+        # Chance that none of the value's spare cards is among the free ones
+        missing = 1.0
+        for drawn in range(top):
+            missing *= (pool - free - drawn) / (pool - drawn)
+        probabilities[value] = 1.0 - missing
+    return probabilities
+
+
+class TableTracker:
+    """Bounds on the cards of every opponent at a table, and of all of them together.
+
+    The table's bounds are the sums of the opponents' bounds, kept up to date
+    on every event, so the odds that any opponent holds a value still take a
+    single pass over the values however many seats there are.
+    """
+
+    def __init__(self, values, hand_sizes):
+        # One tracker per opponent seat, from the cards it holds unseen so far
+        self.opponents = {seat: OpponentTracker(values, size) for seat, size in hand_sizes.items()}
+        self.table = OpponentTracker(values, sum(hand_sizes.values()))
+
+    def drew(self, seat):
+        self.opponents[seat].drew()
+        self.table.drew()
+
+    def asked(self, seat, value, received, holds=True):
+        self._change(seat, value, OpponentTracker.asked, received, holds)
+
+    def cleared(self, seat, value):
+        self._change(seat, value, OpponentTracker.cleared)
+
+    def booked(self, seat, value):
+        self._change(seat, value, OpponentTracker.booked)
+
+    def _change(self, seat, value, event, *args):
+        table = self.table
+        if value not in table.low:
+            return  # Not a value of the game, so nobody can hold it
+        tracker = self.opponents[seat]
+        table.low[value] -= tracker.low[value]
+        table.high[value] -= tracker.high[value]
+        table.marks[value] -= tracker.marks[value]
+        event(tracker, value, *args)
+        table.low[value] += tracker.low[value]
+        table.high[value] += tracker.high[value]
+        table.marks[value] += tracker.marks[value]
+
+    def bounds(self, seat, value, unseen):
+        return self.opponents[seat].bounds(value, unseen)
+
+    def ranges(self, seat, unseen):
+        return self.opponents[seat].ranges(unseen)
+
+    def totals(self, unseen):
+        """ranges() of all opponents' cards together"""
+        return self.table.ranges(unseen)
+
+    def probabilities(self, unseen, hand_size):
+        """Chance that any opponent holds each value; ``hand_size`` counts all their cards"""
+        return self.table.probabilities(unseen, hand_size)
+
+    def state(self):
+        """Every tracker's state() as plain data, for from_state()"""
+        return {
+            'opponents': [[seat, tracker.state()] for seat, tracker in self.opponents.items()],
+            'table': self.table.state(),
+        }
+
+    @classmethod
+    def from_state(cls, values, state):
+        tracker = cls(values, {})
+        tracker.opponents = {
+            seat: OpponentTracker.from_state(values, opponent) for seat, opponent in state['opponents']
+        }
+        tracker.table = OpponentTracker.from_state(values, state['table'])
+        return tracker